@@ -0,0 +1,147 @@
+from concurrent.futures import as_completed
+
+import numpy as np
+
+from .minimal_paths import DistanceType
+from .parallel import single_source_task
+from .results import _kind, _encoder, _decode
+
+Z = 1.959963984540054  # two-sided 95 % confidence
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+NUM_STRATA = 4
+
+
+def degree_strata(hypergraph, participants, num_strata=NUM_STRATA):
+    # participants grouped by quantiles of their number of channels
+    offsets, _ = hypergraph.vertex_incidence()
+    indices = np.array([hypergraph.vertex_index(participant) for participant in participants], dtype=np.int64)
+    degrees = offsets[indices + 1] - offsets[indices]
+    bounds = np.unique(np.quantile(degrees, np.linspace(0, 1, num_strata + 1)[1:-1]))
+    labels = np.searchsorted(bounds, degrees, side='right')
+    strata = [tuple(participants[i] for i in np.flatnonzero(labels == k)) for k in range(len(bounds) + 1)]
+    return [stratum for stratum in strata if stratum]
+
+
+class StratifiedSample:
+    # draws sources without replacement; each draw comes from the stratum furthest below its proportional share,
+    # after every stratum got the two sources its variance estimate needs
+    def __init__(self, strata, seed=None):
+        rng = np.random.default_rng(seed)
+        self.strata = [tuple(stratum[i] for i in rng.permutation(len(stratum))) for stratum in strata]
+        self.drawn = [0] * len(strata)
+
+    def draw(self, size):
+        batch = []
+        for _ in range(size):
+            candidates = [k for k, stratum in enumerate(self.strata) if self.drawn[k] < len(stratum)]
+            if not candidates:
+                break
+            k = min(candidates, key=lambda k: (self.drawn[k] >= 2, self.drawn[k] / len(self.strata[k])))
+            batch += [self.strata[k][self.drawn[k]]]
+            self.drawn[k] += 1
+        return batch
+
+
+class StratifiedEstimator:
+    # running estimates over the sampled sources: the mean reachable fraction of participants, and quantiles of the
+    # distances between all reachable pairs with Woodruff confidence intervals from the linearized ratio estimator
+    def __init__(self, strata):
+        self._strata = strata
+        self._population = sum(len(stratum) for stratum in strata)
+        self._distances: dict = {distance_type: {} for distance_type in DistanceType}
+        self._kinds: dict = {}
+
+    def add(self, distance_type: DistanceType, results: dict):
+        for source, distances in results.items():
+            if distances and distance_type not in self._kinds:
+                self._kinds[distance_type] = _kind(next(iter(distances.values())))
+            encode = _encoder(self._kinds.get(distance_type, 'int'))
+            self._distances[distance_type][source] = np.sort(np.fromiter(map(encode, distances.values()), dtype=np.int64, count=len(distances)))
+
+    def _sampled(self):
+        # sources with results for every distance type, per stratum
+        done = set.intersection(*(set(distances) for distances in self._distances.values()))
+        return [[source for source in stratum if source in done] for stratum in self._strata]
+
+    def _stratified_variance(self, sampled, values: dict):
+        # variance of the stratified estimate of the population total of values
+        variance = 0.0
+        for stratum, sources in zip(self._strata, sampled):
+            n, size = len(sources), len(stratum)
+            if n == size:
+                continue
+            if n < 2:
+                return np.inf
+            variance += size ** 2 * (1 - n / size) * np.var([values[source] for source in sources], ddof=1) / n
+        return variance
+
+    def reachable_fraction(self, sampled):
+        weights = {source: len(stratum) / len(sources) for stratum, sources in zip(self._strata, sampled) for source in sources}
+        fractions = {source: len(self._distances[DistanceType.SHORTEST][source]) / max(1, self._population - 1) for source in weights}
+        estimate = sum(weights[source] * fraction for source, fraction in fractions.items()) / self._population
+        half_width = Z * np.sqrt(self._stratified_variance(sampled, fractions)) / self._population
+        return estimate, max(0.0, estimate - half_width), min(1.0, estimate + half_width), half_width
+
+    def quantiles(self, sampled, distance_type: DistanceType, quantiles=QUANTILES):
+        sources = [(source, len(stratum) / len(members)) for stratum, members in zip(self._strata, sampled) for source in members]
+        distances = self._distances[distance_type]
+        values = np.concatenate([distances[source] for source, _ in sources]) if sources else np.empty(0, dtype=np.int64)
+        if not len(values):
+            return [(q, None, None, None, np.inf) for q in quantiles]
+        pair_weights = np.concatenate([np.full(len(distances[source]), weight) for source, weight in sources])
+        order = np.argsort(values, kind='stable')
+        values, cumulative = values[order], np.cumsum(pair_weights[order])
+        total = cumulative[-1]
+
+        def quantile(p):
+            return int(values[min(len(values) - 1, np.searchsorted(cumulative, min(max(p, 0.0), 1.0) * total))])
+
+        rows = []
+        for q in quantiles:
+            estimate = quantile(q)
+            below = {source: np.searchsorted(distances[source], estimate, side='right') - q * len(distances[source]) for source, _ in sources}
+            half_width = Z * np.sqrt(self._stratified_variance(sampled, below)) / total
+            rows += [(q, estimate, quantile(q - half_width), quantile(q + half_width), half_width)]
+        return rows
+
+    def report(self, quantiles=QUANTILES):
+        import pandas as pd
+        sampled = self._sampled()
+        num_sources = sum(map(len, sampled))
+        estimate, lower, upper, half_width = self.reachable_fraction(sampled)
+        rows = [('reachable_fraction', None, None, estimate, lower, upper, half_width, num_sources)]
+        for distance_type in DistanceType:
+            kind = self._kinds.get(distance_type, 'int')
+            for q, estimate, lower, upper, half_width in self.quantiles(sampled, distance_type, quantiles):
+                if estimate is not None:
+                    estimate, lower, upper = _decode(np.array([estimate, lower, upper], dtype=np.int64), kind)
+                rows += [('quantile', distance_type.name.lower(), q, estimate, lower, upper, half_width, num_sources)]
+        return pd.DataFrame(rows, columns=['statistic', 'distance_type', 'quantile', 'estimate', 'lower', 'upper', 'half_width', 'sources'])
+
+
+def approximate(executor, shared_network, hypergraph, participants, single_source_dijkstra, num_workers, precision, quantiles=QUANTILES, seed=None, batch_size=None):
+    # samples sources batch by batch until every confidence interval is narrower than +-precision
+    # (on the probability scale for quantiles) or all participants were sampled
+    from tqdm import tqdm
+    strata = degree_strata(hypergraph, participants)
+    sample = StratifiedSample(strata, seed)
+    estimator = StratifiedEstimator(strata)
+    batch_size = batch_size or max(2 * len(strata), 4 * num_workers)
+    report = estimator.report(quantiles)
+    with tqdm(total=len(participants), desc=f'Estimate distances at {getattr(hypergraph, "name", "")}'.ljust(36)) as progress:
+        while True:
+            batch = sample.draw(batch_size)
+            if not batch:
+                break
+            chunks = [batch[i::num_workers] for i in range(min(num_workers, len(batch)))]
+            futures = {executor.submit(single_source_task, shared_network.handle, single_source_dijkstra, chunk, distance_type): distance_type
+                       for distance_type in DistanceType for chunk in chunks}
+            for future in as_completed(futures):
+                estimator.add(futures[future], future.result())
+            progress.update(len(batch))
+            report = estimator.report(quantiles)
+            reach = report.iloc[0]
+            progress.set_postfix(reachable=f'{reach.estimate:.3f}±{reach.half_width:.3f}', precision=f'{report.half_width.max():.3f}')
+            if report.half_width.max() <= precision:
+                break
+    return report
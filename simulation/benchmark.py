@@ -0,0 +1,139 @@
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .model import CommunicationNetwork
+from .minimal_paths import single_source_dijkstra_hyperedges, single_source_dijkstra_vertices, all_sources_foremost, DistanceType
+from .parallel import SharedHypergraph, schedule
+from .synthetic import generate_network
+
+ENGINES = {'hyperedges': single_source_dijkstra_hyperedges, 'vertices': single_source_dijkstra_vertices}
+SCALES = (1000, 10000, 100000)
+NUM_SOURCES = 100
+COLUMNS = ['network', 'channels', 'participants', 'phase', 'engine', 'distance_type', 'sources', 'seconds', 'sources_per_second', 'peak_rss_mb', 'mismatches']
+
+
+def peak_rss_mb():
+    # high-water marks of this process and of its terminated children (ru_maxrss is in kilobytes on Linux)
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024
+
+
+def _row(network, phase, seconds, engine=None, distance_type=None, sources=None, mismatches=None):
+    return {'network': network.name, 'channels': len(network.channels()), 'participants': len(network.participants()), 'phase': phase, 'engine': engine,
+            'distance_type': distance_type.name.lower() if distance_type else None, 'sources': sources, 'seconds': seconds,
+            'sources_per_second': sources / seconds if sources and seconds else None, 'peak_rss_mb': peak_rss_mb(), 'mismatches': mismatches}
+
+
+def benchmark_loading(file_path, name=None):
+    # parsing the json, building the binary cache, and memory-mapping it again
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        network = CommunicationNetwork.from_json(file_path, name=name)
+        rows = [_row(network, 'load_json', time.perf_counter() - start)]
+        start = time.perf_counter()
+        network.save(Path(directory)/'network')
+        rows += [_row(network, 'build_cache', time.perf_counter() - start)]
+        start = time.perf_counter()
+        CommunicationNetwork.load(Path(directory)/'network', name=name)
+        rows += [_row(network, 'load_cache', time.perf_counter() - start)]
+    return network, rows
+
+
+def benchmark_engines(network, sources):
+    # single-source engines on the same sources; mismatches count sources whose distances differ from the hyperedge engine
+    rows = []
+    for distance_type in DistanceType:
+        results = {}
+        timings = {}
+        for engine, single_source_dijkstra in ENGINES.items():
+            start = time.perf_counter()
+            results[engine] = {source: single_source_dijkstra(network, source, distance_type) for source in sources}
+            timings[engine] = time.perf_counter() - start
+        if distance_type is DistanceType.FOREMOST:
+            start = time.perf_counter()
+            results['sweep'] = all_sources_foremost(network, sources)
+            timings['sweep'] = time.perf_counter() - start
+        reference = results['hyperedges']
+        for engine, result in results.items():
+            mismatches = sum(result[source] != reference[source] for source in sources)
+            rows += [_row(network, 'engine', timings[engine], engine, distance_type, len(sources), mismatches)]
+    return rows
+
+
+def benchmark_parallel(network, num_processes, engine='hyperedges'):
+    # all sources per distance type through the persistent pool and the scheduler of run_simulation, without storing results
+    participants = tuple(sorted(network.participants()))
+    rows = []
+    with ProcessPoolExecutor(mp_context=mp.get_context('spawn'), max_workers=num_processes) as executor:
+        executor.submit(int).result()  # start up the pool outside the measurement
+        with SharedHypergraph(network) as shared_network:
+            for distance_type in DistanceType:
+                start = time.perf_counter()
+                futures = schedule(executor, shared_network, network, participants, distance_type, ENGINES[engine], num_processes)
+                for future in as_completed(futures):
+                    future.result()
+                rows += [(time.perf_counter() - start, distance_type)]
+    return [_row(network, 'parallel', seconds, engine, distance_type, len(participants)) for seconds, distance_type in rows]
+
+
+def benchmark_run(network, file_path, num_processes, options=()):
+    # end-to-end run_simulation in a scratch directory, with the network in place of the published data set
+    with tempfile.TemporaryDirectory() as directory:
+        network_path = Path(directory)/'data'/'networks'/'microsoft.json.bz2'
+        network_path.parent.mkdir(parents=True)
+        os.symlink(Path(file_path).resolve(), network_path)
+        environment = dict(os.environ, PYTHONPATH=os.pathsep.join([str(Path(__file__).resolve().parents[1]), os.environ.get('PYTHONPATH', '')]))
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-m', 'simulation.run', '--num_processes', str(num_processes), *options],
+                       cwd=directory, env=environment, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        seconds = time.perf_counter() - start
+    return [_row(network, 'run_simulation', seconds, ' '.join(options) or None, None, len(network.participants()))]
+
+
+def benchmark(file_path, name=None, num_sources=NUM_SOURCES, num_processes=None, seed=None, run=True):
+    network, rows = benchmark_loading(file_path, name)
+    participants = sorted(network.participants())
+    sources = [participants[i] for i in np.random.default_rng(seed).choice(len(participants), min(num_sources, len(participants)), replace=False)]
+    rows += benchmark_engines(network, sources)
+    if num_processes:
+        rows += benchmark_parallel(network, num_processes)
+        if run:
+            rows += benchmark_run(network, file_path, num_processes)
+    return pd.DataFrame(rows, columns=COLUMNS).astype({'sources': 'Int64', 'mismatches': 'Int64'})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the minimal path engines on synthetic code review communication networks')
+    parser.add_argument('--channels', type=int, nargs='+', default=SCALES, help=f'Sizes of the generated networks (default {" ".join(map(str, SCALES))})')
+    parser.add_argument('--networks', type=str, nargs='+', default=(), help='Benchmark these network files instead of generated ones')
+    parser.add_argument('--sources', type=int, default=NUM_SOURCES, help=f'Number of sampled sources per engine (default {NUM_SOURCES})')
+    parser.add_argument('--num_processes', type=int, default=mp.cpu_count(), help='Number of parallel processes, 0 to skip the parallel and end-to-end runs (default # of CPUs)')
+    parser.add_argument('--no_run', action='store_true', help='Skip the end-to-end run_simulation')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the generated networks and sampled sources (default 0)')
+    parser.add_argument('--output', type=str, default='./data/benchmarks/benchmark.csv', help='Output csv file (default ./data/benchmarks/benchmark.csv)')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        networks = [(Path(path), Path(path).name.split('.')[0]) for path in args.networks]
+        for num_channels in ([] if args.networks else args.channels):
+            networks += [(generate_network(Path(directory)/f'synthetic-{num_channels}.json.bz2', num_channels, seed=args.seed), f'synthetic-{num_channels}')]
+        for file_path, name in networks:
+            results += [benchmark(file_path, name, args.sources, args.num_processes, args.seed, not args.no_run)]
+            print(results[-1].to_string(index=False))
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    pd.concat(results).to_csv(args.output, index=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+import numpy as np
+
+from .model import CommunicationNetwork
+from .minimal_paths import DistanceType
+from .results import ROW_DTYPE, frame_distances, distance_kind, _encoder
+
+UNREACHED = float('inf')
+
+
+def append_channels(communication_network: CommunicationNetwork, new_channels: CommunicationNetwork):
+    # new channels can only extend existing paths at their end if they are later than every existing channel
+    timings = communication_network.timings()
+    new_timings = new_channels.timings()
+    if set(timings) & set(new_timings):
+        raise ValueError('New channels must not reuse existing channel ids')
+    if timings and new_timings and min(new_timings.values()) <= max(timings.values()):
+        raise ValueError('New channels must be later than all existing channels')
+    channels = {channel: list(communication_network.participants(channel)) for channel in timings}
+    channels.update({channel: list(new_channels.participants(channel)) for channel in new_timings})
+    return CommunicationNetwork(channels, {**timings, **new_timings}, name=communication_network.name)
+
+
+def _time_ordered_groups(communication_network: CommunicationNetwork, channels, index):
+    # the new channels as (participant indices, timing in result units), grouped by equal timing in time order
+    offsets, vertices = communication_network.hyperedge_incidence()
+    to_participant = np.array([index[vertex] for vertex in communication_network.vertex_ids()], dtype=np.int32)
+    codec = communication_network.timing_codec()
+    encode = _encoder(distance_kind(codec, DistanceType.FOREMOST))
+    timing_array = communication_network.timing_array()
+    hedges = sorted((communication_network.hyperedge_index(channel) for channel in channels), key=timing_array.__getitem__)
+    groups: dict = {}
+    for hedge in hedges:
+        timing = int(timing_array[hedge])
+        groups.setdefault(timing, []).append((set(to_participant[vertices[offsets[hedge]:offsets[hedge + 1]]].tolist()), encode(codec.decode(timing))))
+    return list(groups.values())
+
+
+def _shortest_updates(source, old: dict, groups):
+    best: dict = {}
+    for group in groups:
+        reached = []
+        for members, _ in group:
+            distance = 1 if source in members else min((min(old.get(v, UNREACHED), best.get(v, UNREACHED)) for v in members), default=UNREACHED) + 1
+            if distance < UNREACHED:
+                reached += [(members, distance)]
+        for members, distance in reached:
+            for v in members:
+                if distance < best.get(v, UNREACHED):
+                    best[v] = distance
+    return best
+
+
+def _foremost_updates(source, old: dict, groups):
+    best: dict = {}
+    for group in groups:
+        reached = [(members, timing) for members, timing in group if source in members or any(v in old or v in best for v in members)]
+        for members, timing in reached:
+            for v in members:
+                best.setdefault(v, timing)
+    return best
+
+
+def _previous_rows(previous, distance_type: DistanceType, index):
+    categories, sources, targets, values, _ = frame_distances(previous, distance_type)
+    remap = np.array([index[participant] for participant in categories], dtype=np.int32)
+    rows = np.empty(len(sources), dtype=ROW_DTYPE)
+    rows['source'], rows['target'], rows['distance'] = remap[sources], remap[targets], values
+    return rows
+
+
+def update_distances(writer, previous, communication_network: CommunicationNetwork, new_channels, participants):
+    # writes the distances of communication_network, which extends the network of the previous result by the later
+    # new_channels: sources that reach none of their participants keep their previous rows, the shortest and foremost
+    # distances of the others extend their previous distances along the new channels. Fastest distances depend on
+    # departure times a result does not keep; they are left to the minimal path engines for the affected sources.
+    index = {participant: i for i, participant in enumerate(participants)}
+    touched = {index[participant] for channel in new_channels for participant in communication_network.participants(channel)}
+    groups = _time_ordered_groups(communication_network, new_channels, index)
+    # all distance types reach the same pairs, so the affected sources follow from the shortest distances
+    shortest_rows = _previous_rows(previous, DistanceType.SHORTEST, index)
+    affected = sorted(touched | set(np.unique(shortest_rows['source'][np.isin(shortest_rows['target'], list(touched))]).tolist()))
+
+    for distance_type in DistanceType:
+        rows = shortest_rows if distance_type is DistanceType.SHORTEST else _previous_rows(previous, distance_type, index)
+        # from the timings, as an empty previous result has int columns only
+        kind = distance_kind(communication_network.timing_codec(), distance_type)
+        unaffected = ~np.isin(rows['source'], affected)
+        writer.write_rows(distance_type, np.setdiff1d(np.arange(len(participants)), affected).tolist(), rows[unaffected], kind)
+
+        match distance_type:
+            case DistanceType.SHORTEST:
+                updates = _shortest_updates
+            case DistanceType.FOREMOST:
+                updates = _foremost_updates
+            case DistanceType.FASTEST:
+                continue
+        rows = rows[~unaffected]
+        starts = np.searchsorted(rows['source'], affected)
+        ends = np.searchsorted(rows['source'], affected, side='right')
+        for source, start, end in zip(affected, starts.tolist(), ends.tolist()):
+            row = rows[start:end].copy()
+            old = {target: distance for target, distance in zip(row['target'].tolist(), row['distance'].tolist()) if target in touched}
+            best = updates(source, old, groups)
+            best.pop(source, None)
+            new_targets = np.fromiter(best, dtype=np.int32, count=len(best))
+            new_distances = np.fromiter(best.values(), dtype=np.int64, count=len(best))
+            positions = np.searchsorted(row['target'], new_targets)
+            known = positions < len(row)
+            known[known] = row['target'][positions[known]] == new_targets[known]
+            row['distance'][positions[known]] = np.minimum(row['distance'][positions[known]], new_distances[known])
+            added = np.empty(int((~known).sum()), dtype=ROW_DTYPE)
+            added['source'], added['target'], added['distance'] = source, new_targets[~known], new_distances[~known]
+            writer.write_rows(distance_type, [source], np.concatenate([row, added]), kind)
+    return affected
@@ -0,0 +1,31 @@
+import argparse
+from pathlib import Path
+import shutil
+
+from .model import file_hash
+from .results import read_shards, merge_shards, write_result_meta, appended_paths
+from .run import AVAILABLE_DATA_SETS, load_network
+
+
+def merge():
+    parser = argparse.ArgumentParser(description='Merge the shards of simulation runs with --shard i/N into the results of a single-node run')
+    parser.add_argument('--select', type=str, nargs='+', choices=AVAILABLE_DATA_SETS, help='Merge a subset of the available data', default=AVAILABLE_DATA_SETS)
+    parser.add_argument('--keep', action='store_true', help='Keep the shard directories after merging')
+    args = parser.parse_args()
+
+    result_dir_path = Path('./data/minimal_paths/')
+    for name in args.select:
+        network_path = f'./data/networks/{name}.json.bz2'
+        communication_network, *_ = load_network(name)
+        participants = tuple(sorted(communication_network.participants()))
+        result = merge_shards(read_shards(result_dir_path, name, participants, network_path), participants)
+        result.info(verbose=True, memory_usage=True, show_counts=True)
+        result.to_csv(result_dir_path/f'{name}.csv.bz2', compression='bz2')
+        result.to_pickle(result_dir_path/f'{name}.pickle.bz2', compression='bz2')
+        write_result_meta(result_dir_path, name, file_hash(network_path), appended_paths(result_dir_path, name, network_path))
+        if not args.keep:
+            shutil.rmtree(result_dir_path/f'{name}.shards')
+
+
+if __name__ == '__main__':
+    merge()
@@ -0,0 +1,66 @@
+from contextlib import contextmanager
+from pathlib import Path
+import json
+import time
+
+from .minimal_paths import DistanceType
+
+
+class Metrics:
+    # structured run metrics as json lines: one 'source' record per source and distance type with its search counters
+    # and wall time, and one 'phase' record per network, phase, and distance type with the accumulated seconds.
+    # Without a path nothing is recorded and the tasks are not instrumented; each batch of records is appended at once
+    def __init__(self, path=None, append=False):
+        self.enabled = path is not None
+        self._path = Path(path) if self.enabled else None
+        if self.enabled and not append:
+            self._path.write_text('', encoding='utf-8')
+        self._phases: dict = {}
+
+    def add(self, phase, seconds, distance_type: DistanceType = None):
+        key = (phase, distance_type)
+        self._phases[key] = self._phases.get(key, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, phase, distance_type: DistanceType = None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - start, distance_type)
+
+    def sources(self, network, distance_type: DistanceType, engine, records):
+        if self.enabled:
+            self._write({'record': 'source', 'network': network, 'distance_type': distance_type.name.lower(), 'engine': engine, **record} for record in records)
+
+    def close_network(self, network):
+        # writes and resets the phase timings of a network
+        if self.enabled:
+            self._write({'record': 'phase', 'network': network, 'phase': phase, 'distance_type': distance_type.name.lower() if distance_type else None, 'seconds': seconds}
+                        for (phase, distance_type), seconds in self._phases.items())
+        self._phases = {}
+
+    def _write(self, records):
+        with self._path.open('a', encoding='utf-8') as file:
+            file.writelines(json.dumps(record, default=str) + '\n' for record in records)
+
+    def close(self):
+        # records are written as they come, so there is nothing left to release
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+def read_metrics(path):
+    # source and phase records as two data frames
+    import pandas as pd
+    records = pd.read_json(path, lines=True, dtype=False)
+    if records.empty:
+        return records, records
+    sources = records[records.record == 'source'].dropna(axis=1, how='all').drop(columns='record').reset_index(drop=True)
+    phases = records[records.record == 'phase'].dropna(axis=1, how='all').drop(columns='record').reset_index(drop=True)
+    return sources, phases
@@ -1,101 +1,653 @@
 import heapq
+from collections import Counter
+from functools import partial
+from operator import itemgetter
+from bisect import bisect_left, bisect_right
 from enum import Enum
-from datetime import datetime
+
+import numpy as np
 
 from .model import TimeVaryingHypergraph
 
 
+UNBOUNDED = -(1 << 63)
+
+
 class DistanceType(Enum):
     SHORTEST = 0
     FASTEST = 1
     FOREMOST = 2
 
 
-def single_source_dijkstra_hyperedges(hypergraph: TimeVaryingHypergraph, source_vertex, distance_type: DistanceType, min_timing=datetime.min):
-    hedge_distances: dict = {}
-    queue: list = []
+class SearchCounters:
+    # optional instrumentation of one search: passed to the heap kernels in place of heapq, it counts pushes, pops, and
+    # the peak queue size; the remaining counters are derived from the labels afterwards, so plain searches run unchanged
+    def __init__(self):
+        self.pushes = self.pops = self.peak_queue = 0
+        self.labels = self.relaxations = self.stale = None
+
+    def heapify(self, queue):
+        heapq.heapify(queue)
+        self.pushes += len(queue)
+        self.peak_queue = max(self.peak_queue, len(queue))
+
+    def heappush(self, queue, item):
+        heapq.heappush(queue, item)
+        self.pushes += 1
+        if len(queue) > self.peak_queue:
+            self.peak_queue = len(queue)
+
+    def heappop(self, queue):
+        self.pops += 1
+        return heapq.heappop(queue)
+
+    def count(self, distance_type, distances: dict, relaxations, ordered=False):
+        # ordered: the search ran on the heap whatever its distance type, as searches for targets and vertex foremost searches do
+        self.labels, self.relaxations = len(distances), relaxations
+        if distance_type is DistanceType.FASTEST or ordered:
+            # every label is popped once with its final distance, all other pops are stale entries
+            self.stale = self.pops - self.labels
+        else:
+            # BFS and reachability push and pop every label once; a BFS frontier holds the labels of one distance
+            self.pushes = self.pops = self.labels
+            self.stale = 0
+            self.peak_queue = max(Counter(distances.values()).values(), default=0) if distance_type is DistanceType.SHORTEST else None
+
+    def as_dict(self):
+        return {'labels': self.labels, 'pushes': self.pushes, 'pops': self.pops, 'stale': self.stale, 'relaxations': self.relaxations, 'peak_queue': self.peak_queue}
+
+
+def _check_min_timing(hypergraph: TimeVaryingHypergraph, distance_type: DistanceType, min_timing):
+    # information is available at the source before any channel, so only the kind of min_timing matters
+    if distance_type is not DistanceType.SHORTEST and min_timing is not None:
+        hypergraph.timing_codec().encode_bound(min_timing)
+
+
+def _decoder(hypergraph: TimeVaryingHypergraph, distance_type: DistanceType):
+    match distance_type:
+        case DistanceType.SHORTEST:
+            return None
+        case DistanceType.FASTEST:
+            return hypergraph.timing_codec().decode_duration
+        case DistanceType.FOREMOST:
+            return hypergraph.timing_codec().decode
+
+
+def _vertex_distances(hypergraph: TimeVaryingHypergraph, distances: dict, decode, encoded=False):
+    # encoded results keep vertex indices and the integer distances of the timing codec
+    if encoded:
+        return distances
+    vertex_ids = hypergraph.vertex_ids()
+    if decode is None:
+        return {vertex_ids[vertex]: distance for vertex, distance in distances.items()}
+    return {vertex_ids[vertex]: decode(distance) for vertex, distance in distances.items()}
+
+
+def _incidence_views(hypergraph: TimeVaryingHypergraph):
+    hedge_offsets, hedge_vertices = hypergraph.hyperedge_incidence()
+    vertex_offsets, vertex_hedges = hypergraph.vertex_incidence()
+    return tuple(map(memoryview, (hedge_offsets, hedge_vertices, vertex_offsets, vertex_hedges, hypergraph.timing_array())))
 
-    for source_hedge in hypergraph.hyperedges(source_vertex):
-        match distance_type:
-            case DistanceType.SHORTEST:
-                init_value = 1
-            case DistanceType.FASTEST:
-                init_value = min_timing - min_timing
-            case DistanceType.FOREMOST:
-                init_value = hypergraph.timings(source_hedge)
-        heapq.heappush(queue, (init_value, source_hedge))
-        hedge_distances[source_hedge] = init_value
 
+# hyperedge kernels: distances of the hyperedges reached from the initial hyperedges along the temporal successor index;
+# successors are in time order, so a window end cuts off a bisected suffix
+
+def _shortest_hyperedges(successor_offsets, successors, timings, initial_hedges, end=None):
+    # level-synchronous BFS
+    timing_of = timings.__getitem__
+    frontier = initial_hedges
+    hedge_distances = dict.fromkeys(frontier, 1)
+    distance = 1
+    while frontier:
+        distance += 1
+        next_frontier = []
+        for hedge in frontier:
+            stop = successor_offsets[hedge + 1] if end is None else bisect_right(successors, end, successor_offsets[hedge], successor_offsets[hedge + 1], key=timing_of)
+            for next_hedge in successors[successor_offsets[hedge]:stop]:
+                if next_hedge not in hedge_distances:
+                    hedge_distances[next_hedge] = distance
+                    next_frontier.append(next_hedge)
+        frontier = next_frontier
+    return hedge_distances
+
+
+def _fastest_hyperedges(successor_offsets, successors, timings, initial_hedges, end=None, heap=heapq):
+    heappush, heappop = heap.heappush, heap.heappop
+    timing_of = timings.__getitem__
+    hedge_distances = dict.fromkeys(initial_hedges, 0)
+    queue = [(0, hedge) for hedge in hedge_distances]
+    heap.heapify(queue)
     while queue:
-        prior_distance, source_hedge = heapq.heappop(queue)
-        source_hedge_timing = hypergraph.timings(source_hedge)
-        for vertex in hypergraph.vertices(source_hedge):
-            for next_hedge in hypergraph.hyperedges(vertex):
-                next_hedge_timing = hypergraph.timings(next_hedge)
-                if source_hedge_timing < next_hedge_timing:
-                    match distance_type:
-                        case DistanceType.SHORTEST:
-                            new_distance = prior_distance + 1
-                        case DistanceType.FASTEST:
-                            new_distance = prior_distance + (next_hedge_timing - source_hedge_timing)
-                        case DistanceType.FOREMOST:
-                            new_distance = next_hedge_timing
-                    if next_hedge not in hedge_distances or new_distance < hedge_distances[next_hedge]:
-                        hedge_distances[next_hedge] = new_distance
-                        heapq.heappush(queue, (new_distance, next_hedge))
+        distance, hedge = heappop(queue)
+        if distance > hedge_distances[hedge]:  # stale entry
+            continue
+        start = distance - timings[hedge]
+        stop = successor_offsets[hedge + 1] if end is None else bisect_right(successors, end, successor_offsets[hedge], successor_offsets[hedge + 1], key=timing_of)
+        for next_hedge in successors[successor_offsets[hedge]:stop]:
+            new_distance = start + timings[next_hedge]
+            if new_distance < hedge_distances.get(next_hedge, new_distance + 1):
+                hedge_distances[next_hedge] = new_distance
+                heappush(queue, (new_distance, next_hedge))
+    return hedge_distances
+
+
+def _foremost_hyperedges(successor_offsets, successors, timings, initial_hedges, end=None):
+    # a reached hyperedge is reached at its own timing, so plain reachability suffices
+    timing_of = timings.__getitem__
+    stack = initial_hedges
+    hedge_distances = {hedge: timings[hedge] for hedge in stack}
+    while stack:
+        hedge = stack.pop()
+        stop = successor_offsets[hedge + 1] if end is None else bisect_right(successors, end, successor_offsets[hedge], successor_offsets[hedge + 1], key=timing_of)
+        for next_hedge in successors[successor_offsets[hedge]:stop]:
+            if next_hedge not in hedge_distances:
+                hedge_distances[next_hedge] = timings[next_hedge]
+                stack.append(next_hedge)
+    return hedge_distances
+
 
+def _hyperedge_kernel(distance_type: DistanceType):
+    match distance_type:
+        case DistanceType.SHORTEST:
+            kernel = _shortest_hyperedges
+        case DistanceType.FASTEST:
+            kernel = _fastest_hyperedges
+        case DistanceType.FOREMOST:
+            kernel = _foremost_hyperedges
+    return kernel
+
+
+def _targeted_hyperedges(successor_offsets, successors, hedge_offsets, hedge_vertices, timings, hedge_distances: dict, hops, targets=None, bound=None, end=None, heap=heapq):
+    # label-setting search in order of distance for all distance types: hop counts grow by one along a successor, and
+    # durations and arrivals by the difference of the timings, so a hyperedge is final once popped and a vertex once the
+    # first of its hyperedges is. Stops once all targets are settled or the distance exceeds the bound, and returns the
+    # settled hyperedges and the distances of the settled targets (of all vertices without targets)
+    heappush, heappop = heap.heappush, heap.heappop
+    timing_of = timings.__getitem__
+    queue = [(distance, hedge) for hedge, distance in hedge_distances.items()]
+    heap.heapify(queue)
+    settled: dict = {}
     vertex_distances: dict = {}
-    for source_hedge, distance in hedge_distances.items():
-        for vertex in hypergraph.vertices(source_hedge):
-            if vertex not in vertex_distances or distance < vertex_distances[vertex]:
+    remaining = -1 if targets is None else len(targets)
+    while queue and len(vertex_distances) != remaining:
+        distance, hedge = heappop(queue)
+        if distance > hedge_distances[hedge]:  # stale entry
+            continue
+        if bound is not None and distance > bound:
+            break
+        settled[hedge] = distance
+        for vertex in hedge_vertices[hedge_offsets[hedge]:hedge_offsets[hedge + 1]]:
+            if vertex not in vertex_distances and (targets is None or vertex in targets):
                 vertex_distances[vertex] = distance
-    vertex_distances.pop(source_vertex)
-    return vertex_distances
+        offset = None if hops else distance - timings[hedge]
+        stop = successor_offsets[hedge + 1] if end is None else bisect_right(successors, end, successor_offsets[hedge], successor_offsets[hedge + 1], key=timing_of)
+        for next_hedge in successors[successor_offsets[hedge]:stop]:
+            new_distance = distance + 1 if offset is None else offset + timings[next_hedge]
+            if new_distance < hedge_distances.get(next_hedge, new_distance + 1):
+                hedge_distances[next_hedge] = new_distance
+                heappush(queue, (new_distance, next_hedge))
+    return settled, vertex_distances
 
 
-def single_source_dijkstra_vertices(hypergraph: TimeVaryingHypergraph, source_vertex, distance_type: DistanceType, min_timing=datetime.min):
-    distances: dict = {}
-    queue: list = []
+def _initial_distances(distance_type: DistanceType, timings, initial_hedges):
+    match distance_type:
+        case DistanceType.SHORTEST:
+            distances = dict.fromkeys(initial_hedges, 1)
+        case DistanceType.FASTEST:
+            distances = dict.fromkeys(initial_hedges, 0)
+        case DistanceType.FOREMOST:
+            distances = {hedge: timings[hedge] for hedge in initial_hedges}
+    return distances
 
-    source_hedge = None
-    source_reachable = (source_vertex, source_hedge)
 
+def _encoded_bound(hypergraph: TimeVaryingHypergraph, distance_type: DistanceType, max_distance):
+    # hop count, duration, or latest arrival timing
     match distance_type:
         case DistanceType.SHORTEST:
-            init_distance = 0
+            bound = max_distance
         case DistanceType.FASTEST:
-            init_distance = min_timing - min_timing
+            bound = hypergraph.timing_codec().encode_duration(max_distance)
         case DistanceType.FOREMOST:
-            init_distance = min_timing
+            bound = hypergraph.timing_codec().encode_bound(max_distance)
+    return bound
+
+
+def _target_indices(hypergraph: TimeVaryingHypergraph, targets, source):
+    return None if targets is None else {hypergraph.vertex_index(target) for target in targets} - {source}
+
+
+def _own_hyperedges(vertex_offsets, vertex_hedges, timings, vertex, start=None, end=None):
+    lo, hi = vertex_offsets[vertex], vertex_offsets[vertex + 1]
+    if start is not None:
+        lo = bisect_left(vertex_hedges, start, lo, hi, key=timings.__getitem__)
+    if end is not None:
+        hi = bisect_right(vertex_hedges, end, lo, hi, key=timings.__getitem__)
+    return vertex_hedges[lo:hi].tolist()
+
+
+def _hyperedge_to_vertex_distances(hedge_offsets, hedge_vertices, hedge_distances, source):
+    vertex_distances: dict = {}
+    for hedge, distance in hedge_distances.items():
+        for vertex in hedge_vertices[hedge_offsets[hedge]:hedge_offsets[hedge + 1]]:
+            if distance < vertex_distances.get(vertex, distance + 1):
+                vertex_distances[vertex] = distance
+    vertex_distances.pop(source, None)
+    return vertex_distances
+
+
+def _hyperedge_relaxations(successor_offsets, successors, timings, hedge_distances, end=None):
+    # successors scanned by the hyperedge kernels
+    if end is None:
+        return sum(successor_offsets[hedge + 1] - successor_offsets[hedge] for hedge in hedge_distances)
+    return sum(bisect_right(successors, end, successor_offsets[hedge], successor_offsets[hedge + 1], key=timings.__getitem__) - successor_offsets[hedge] for hedge in hedge_distances)
+
+
+def single_source_dijkstra_hyperedges(hypergraph: TimeVaryingHypergraph, source_vertex, distance_type: DistanceType, min_timing=None, window=None, encoded=False, counters=None,
+                                      targets=None, max_distance=None):
+    # counters: optional SearchCounters filled in by the search; with targets, only their distances are returned, and with
+    # max_distance (hops, a duration, or a latest arrival) only distances up to it, each searching no further than needed
+    source = hypergraph.vertex_index(source_vertex)
+    _check_min_timing(hypergraph, distance_type, min_timing)
+    kernel = _hyperedge_kernel(distance_type)
+    if counters is not None and distance_type is DistanceType.FASTEST:
+        kernel = partial(kernel, heap=counters)
+    start, end = hypergraph.window_bounds(*window) if window else (None, None)
+    hedge_offsets, hedge_vertices, vertex_offsets, vertex_hedges, timings = _incidence_views(hypergraph)
+    successor_offsets, successors = map(memoryview, hypergraph.successor_incidence())
+    if targets is not None or max_distance is not None:
+        target_indices = _target_indices(hypergraph, targets, source)
+        bound = None if max_distance is None else _encoded_bound(hypergraph, distance_type, max_distance)
+        if distance_type is DistanceType.FOREMOST and bound is not None:
+            end = bound if end is None else min(end, bound)
+        initial_distances = _initial_distances(distance_type, timings, _own_hyperedges(vertex_offsets, vertex_hedges, timings, source, start, end))
+        hedge_distances, vertex_distances = _targeted_hyperedges(successor_offsets, successors, hedge_offsets, hedge_vertices, timings, initial_distances,
+                                                                 distance_type is DistanceType.SHORTEST, target_indices, bound, end, heapq if counters is None else counters)
+        if counters is not None:
+            counters.count(distance_type, hedge_distances, _hyperedge_relaxations(successor_offsets, successors, timings, hedge_distances, end), ordered=True)
+        vertex_distances.pop(source, None)
+        return _vertex_distances(hypergraph, vertex_distances, _decoder(hypergraph, distance_type), encoded)
+    hedge_distances = kernel(successor_offsets, successors, timings, _own_hyperedges(vertex_offsets, vertex_hedges, timings, source, start, end), end)
+    if counters is not None:
+        counters.count(distance_type, hedge_distances, _hyperedge_relaxations(successor_offsets, successors, timings, hedge_distances, end))
+    vertex_distances = _hyperedge_to_vertex_distances(hedge_offsets, hedge_vertices, hedge_distances, source)
+    return _vertex_distances(hypergraph, vertex_distances, _decoder(hypergraph, distance_type), encoded)
+
+
+def sliding_windows(start, end, length, step):
+    # closed windows [window_start, window_start + length] every step from start on, until one reaches end
+    windows = []
+    while True:
+        windows += [(start, start + length)]
+        if start + length >= end:
+            return windows
+        start += step
 
-    distances[source_reachable] = init_distance
-    heapq.heappush(queue, (init_distance, source_reachable))
 
+def single_source_windows(hypergraph: TimeVaryingHypergraph, source_vertex, distance_type: DistanceType, windows):
+    # hyperedge distances only depend on the hyperedges a search starts from, and never on later hyperedges; windows in
+    # which the source starts from the same hyperedges share one search up to their latest end, and differ only in the
+    # hyperedges they cut off
+    source = hypergraph.vertex_index(source_vertex)
+    kernel = _hyperedge_kernel(distance_type)
+    decode = _decoder(hypergraph, distance_type)
+    hedge_offsets, hedge_vertices, vertex_offsets, vertex_hedges, timings = _incidence_views(hypergraph)
+    successor_offsets, successors = map(memoryview, hypergraph.successor_incidence())
+
+    searches: dict = {}
+    for window in windows:
+        start, end = hypergraph.window_bounds(*window)
+        initial_hedges = _own_hyperedges(vertex_offsets, vertex_hedges, timings, source, start)
+        # a suffix of the time ordered hyperedges of the source, identified by its length
+        searches.setdefault(len(initial_hedges), (initial_hedges, []))[1].append((window, end))
+    results = {}
+    for initial_hedges, windows_ends in searches.values():
+        latest = None if any(end is None for _, end in windows_ends) else max(end for _, end in windows_ends)
+        hedge_distances = kernel(successor_offsets, successors, timings, [hedge for hedge in initial_hedges if latest is None or timings[hedge] <= latest], latest)
+        for window, end in windows_ends:
+            cut = hedge_distances if end is None else {hedge: distance for hedge, distance in hedge_distances.items() if timings[hedge] <= end}
+            results[window] = _vertex_distances(hypergraph, _hyperedge_to_vertex_distances(hedge_offsets, hedge_vertices, cut, source), decode)
+    return {window: results[window] for window in windows}
+
+
+def single_source_profile(hypergraph: TimeVaryingHypergraph, source_vertex):
+    # earliest-arrival profiles for all departure times in one time ordered pass: for each target, the Pareto set of
+    # (departure, arrival) timings, where departure is the timing of the source's channel a path starts with; both
+    # increase along a profile. A hyperedge is final once popped, since all its predecessors are earlier
+    heappush, heappop = heapq.heappush, heapq.heappop
+    source = hypergraph.vertex_index(source_vertex)
+    hedge_offsets, hedge_vertices, vertex_offsets, vertex_hedges, timings = _incidence_views(hypergraph)
+    successor_offsets, successors = map(memoryview, hypergraph.successor_incidence())
+
+    departures = {hedge: timings[hedge] for hedge in vertex_hedges[vertex_offsets[source]:vertex_offsets[source + 1]].tolist()}
+    queue = [(timing, hedge) for hedge, timing in departures.items()]
+    heapq.heapify(queue)
+    profiles: dict = {}
+    while queue:
+        arrival, hedge = heappop(queue)
+        departure = departures[hedge]
+        for next_hedge in successors[successor_offsets[hedge]:successor_offsets[hedge + 1]]:
+            if next_hedge not in departures:
+                departures[next_hedge] = departure
+                heappush(queue, (timings[next_hedge], next_hedge))
+            elif departure > departures[next_hedge]:
+                departures[next_hedge] = departure
+        for vertex in hedge_vertices[hedge_offsets[hedge]:hedge_offsets[hedge + 1]]:
+            profile = profiles.setdefault(vertex, [])
+            if not profile or departure > profile[-1][0]:
+                if profile and profile[-1][1] == arrival:
+                    profile.pop()
+                profile.append((departure, arrival))
+    profiles.pop(source, None)
+
+    vertex_ids, decode = hypergraph.vertex_ids(), hypergraph.timing_codec().decode
+    return {vertex_ids[vertex]: [(decode(departure), decode(arrival)) for departure, arrival in profile] for vertex, profile in profiles.items()}
+
+
+def foremost_at(profiles: dict, departure=None):
+    # foremost arrivals if information appears at the source at departure (None: before all channels)
+    arrivals = {}
+    for target, profile in profiles.items():
+        i = 0 if departure is None else bisect_left(profile, departure, key=itemgetter(0))
+        if i < len(profile):
+            arrivals[target] = profile[i][1]
+    return arrivals
+
+
+def fastest_at(profiles: dict, departure=None):
+    # fastest durations if information appears at the source at departure (None: before all channels)
+    durations = {}
+    for target, profile in profiles.items():
+        i = 0 if departure is None else bisect_left(profile, departure, key=itemgetter(0))
+        if i < len(profile):
+            durations[target] = min(arrival - start for start, arrival in profile[i:])
+    return durations
+
+
+# vertex kernels: distances of (vertex, hyperedge) labels; the source label has no hyperedge yet.
+# the hyperedges of a vertex are in time order, so the ones later than a label's hyperedge are a bisected suffix.
+# A label is dominated by a label of the same vertex with an earlier or equal timing that is no worse: the suffix of the
+# latter includes that of the former at no larger distances, so dominated labels are never expanded, though the
+# fastest and foremost kernels may queue a label before the one dominating it. Labels at the source are all dominated by
+# the source label
+
+def _shortest_vertices(hedge_offsets, hedge_vertices, vertex_offsets, vertex_hedges, timings, source, start=None, end=None):
+    # BFS creates labels in order of distance, so only a label earlier than all labels of its vertex is not dominated
+    timing_of = timings.__getitem__
+    distances = {(source, None): 0}
+    earliest = {source: UNBOUNDED}
+    frontier = [(source, None)]
+    distance = 0
+    while frontier:
+        distance += 1
+        next_frontier = []
+        for vertex, hedge in frontier:
+            lo, hi = vertex_offsets[vertex], vertex_offsets[vertex + 1]
+            if hedge is not None:
+                lo = bisect_right(vertex_hedges, timings[hedge], lo, hi, key=timing_of)
+            elif start is not None:
+                lo = bisect_left(vertex_hedges, start, lo, hi, key=timing_of)
+            if end is not None:
+                hi = bisect_right(vertex_hedges, end, lo, hi, key=timing_of)
+            for next_hedge in vertex_hedges[lo:hi]:
+                next_timing = timings[next_hedge]
+                for next_vertex in hedge_vertices[hedge_offsets[next_hedge]:hedge_offsets[next_hedge + 1]]:
+                    if next_timing < earliest.get(next_vertex, next_timing + 1):
+                        earliest[next_vertex] = next_timing
+                        label = (next_vertex, next_hedge)
+                        distances[label] = distance
+                        next_frontier.append(label)
+        frontier = next_frontier
+    return distances
+
+
+def _fastest_vertices(hedge_offsets, hedge_vertices, vertex_offsets, vertex_hedges, timings, source, start=None, end=None, heap=heapq):
+    # a label at distance d leaves its vertex at offset d - timing, and is dominated by one with an earlier or equal timing
+    # and a smaller or equal offset. Per vertex, the non-dominated labels are kept as a frontier of timings in increasing
+    # order and their offsets, which then strictly decrease
+    heappush, heappop = heap.heappush, heap.heappop
+    timing_of = timings.__getitem__
+    distances = {(source, None): 0}
+    frontiers = {source: ([UNBOUNDED], [UNBOUNDED])}
+    queue = [(0, (source, None))]
+    heap.heapify(queue)
     while queue:
-        distance, (vertex, source_hedge) = heapq.heappop(queue)
-        for next_hedge in hypergraph.hyperedges(vertex):
-            if source_hedge:
-                source_hedge_timing = hypergraph.timings(source_hedge)
-            else:  # damn source_hedge
-                source_hedge_timing = hypergraph.timings(next_hedge)
-            next_hedge_timing = hypergraph.timings(next_hedge)
-            if not source_hedge or source_hedge_timing < next_hedge_timing:
-                for next_vertex in hypergraph.vertices(next_hedge):
-                    new_reachable = (next_vertex, next_hedge)
-                    match distance_type:
-                        case DistanceType.SHORTEST:
-                            new_distance = distance + 1
-                        case DistanceType.FASTEST:
-                            new_distance = distance + (next_hedge_timing - source_hedge_timing)
-                        case DistanceType.FOREMOST:
-                            new_distance = next_hedge_timing
-                    if new_reachable not in distances or new_distance < distances[new_reachable]:
-                        distances[new_reachable] = new_distance
-                        heapq.heappush(queue, (new_distance, new_reachable))
+        distance, (vertex, hedge) = heappop(queue)
+        lo, hi = vertex_offsets[vertex], vertex_offsets[vertex + 1]
+        if hedge is None:
+            arrival = None
+            if start is not None:
+                lo = bisect_left(vertex_hedges, start, lo, hi, key=timing_of)
+        else:
+            if distance > distances[(vertex, hedge)]:  # stale entry
+                continue
+            arrival = timings[hedge]
+            frontier_timings, offsets = frontiers[vertex]
+            i = bisect_right(frontier_timings, arrival) - 1
+            if frontier_timings[i] != arrival or offsets[i] != distance - arrival:  # dominated since it was queued
+                continue
+            lo = bisect_right(vertex_hedges, arrival, lo, hi, key=timing_of)
+        if end is not None:
+            hi = bisect_right(vertex_hedges, end, lo, hi, key=timing_of)
+        for next_hedge in vertex_hedges[lo:hi]:
+            next_timing = timings[next_hedge]
+            new_distance = distance if arrival is None else distance + (next_timing - arrival)
+            offset = new_distance - next_timing
+            for next_vertex in hedge_vertices[hedge_offsets[next_hedge]:hedge_offsets[next_hedge + 1]]:
+                frontier = frontiers.get(next_vertex)
+                if frontier is None:
+                    frontiers[next_vertex] = ([next_timing], [offset])
+                else:
+                    frontier_timings, offsets = frontier
+                    i = bisect_right(frontier_timings, next_timing)
+                    if i and offsets[i - 1] <= offset:
+                        continue
+                    # drop the labels the new one dominates: a following run of offsets not smaller than its own
+                    first = i - 1 if i and frontier_timings[i - 1] == next_timing else i
+                    last = i
+                    while last < len(offsets) and offsets[last] >= offset:
+                        last += 1
+                    frontier_timings[first:last] = [next_timing]
+                    offsets[first:last] = [offset]
+                label = (next_vertex, next_hedge)
+                distances[label] = new_distance
+                heappush(queue, (new_distance, label))
+    return distances
+
+
+def _foremost_vertices(hedge_offsets, hedge_vertices, vertex_offsets, vertex_hedges, timings, source, start=None, end=None, heap=heapq):
+    # a label is reached at the timing of its hyperedge; labels are expanded in order of their timings, and a vertex is
+    # only queued again with an earlier timing, so its first popped label is its earliest and the only one kept and expanded
+    heappush, heappop = heap.heappush, heap.heappop
+    timing_of = timings.__getitem__
+    distances = {}
+    earliest = {source: UNBOUNDED}
+    queue = [(UNBOUNDED, (source, None))]
+    heap.heapify(queue)
+    while queue:
+        timing, (vertex, hedge) = heappop(queue)
+        if timing > earliest[vertex]:  # stale entry
+            continue
+        distances[(vertex, hedge)] = timing
+        lo, hi = vertex_offsets[vertex], vertex_offsets[vertex + 1]
+        if hedge is not None:
+            lo = bisect_right(vertex_hedges, timing, lo, hi, key=timing_of)
+        elif start is not None:
+            lo = bisect_left(vertex_hedges, start, lo, hi, key=timing_of)
+        if end is not None:
+            hi = bisect_right(vertex_hedges, end, lo, hi, key=timing_of)
+        for next_hedge in vertex_hedges[lo:hi]:
+            next_timing = timings[next_hedge]
+            for next_vertex in hedge_vertices[hedge_offsets[next_hedge]:hedge_offsets[next_hedge + 1]]:
+                if next_timing < earliest.get(next_vertex, next_timing + 1):
+                    earliest[next_vertex] = next_timing
+                    heappush(queue, (next_timing, (next_vertex, next_hedge)))
+    return distances
+
+
+def _vertex_relaxations(hedge_offsets, vertex_offsets, vertex_hedges, timings, distances: dict, start=None, end=None):
+    # (vertex, hyperedge) candidates examined by the vertex kernels, from prefix sums of the hyperedge sizes along the vertex incidence;
+    # an upper bound for fastest searches, which keep the labels dominated after they were queued without expanding them
+    timing_of = timings.__getitem__
+    sizes = np.diff(np.asarray(hedge_offsets))[np.asarray(vertex_hedges)]
+    cumulative = np.concatenate([[0], np.cumsum(sizes)]).tolist()
+    relaxations = 0
+    for vertex, hedge in distances:
+        lo, hi = vertex_offsets[vertex], vertex_offsets[vertex + 1]
+        if hedge is not None:
+            lo = bisect_right(vertex_hedges, timings[hedge], lo, hi, key=timing_of)
+        elif start is not None:
+            lo = bisect_left(vertex_hedges, start, lo, hi, key=timing_of)
+        if end is not None:
+            hi = bisect_right(vertex_hedges, end, lo, hi, key=timing_of)
+        relaxations += cumulative[hi] - cumulative[lo]
+    return relaxations
+
+
+def single_source_dijkstra_vertices(hypergraph: TimeVaryingHypergraph, source_vertex, distance_type: DistanceType, min_timing=None, window=None, encoded=False, counters=None,
+                                    targets=None, max_distance=None):
+    # counters: optional SearchCounters filled in by the search; targets and max_distance restrict the results as in
+    # single_source_dijkstra_hyperedges, but the search is not cut short
+    source = hypergraph.vertex_index(source_vertex)
+    target_indices = _target_indices(hypergraph, targets, source)
+    _check_min_timing(hypergraph, distance_type, min_timing)
+    match distance_type:
+        case DistanceType.SHORTEST:
+            kernel = _shortest_vertices
+        case DistanceType.FASTEST:
+            kernel = _fastest_vertices
+        case DistanceType.FOREMOST:
+            kernel = _foremost_vertices
+    if counters is not None and distance_type is not DistanceType.SHORTEST:
+        kernel = partial(kernel, heap=counters)
+    views = _incidence_views(hypergraph)
+    bounds = hypergraph.window_bounds(*window) if window else (None, None)
+    distances = kernel(*views, source, *bounds)
+    if counters is not None:
+        hedge_offsets, _, vertex_offsets, vertex_hedges, timings = views
+        counters.count(distance_type, distances, _vertex_relaxations(hedge_offsets, vertex_offsets, vertex_hedges, timings, distances, *bounds),
+                       ordered=distance_type is DistanceType.FOREMOST)
+
     minimal_distances: dict = {}
     for (vertex, _), distance in distances.items():
-        if vertex not in minimal_distances or distance < minimal_distances[vertex]:
+        if distance < minimal_distances.get(vertex, distance + 1):
             minimal_distances[vertex] = distance
-    minimal_distances.pop(source_vertex)
+    minimal_distances.pop(source)
+    if target_indices is not None:
+        minimal_distances = {vertex: distance for vertex, distance in minimal_distances.items() if vertex in target_indices}
+    if max_distance is not None:
+        bound = _encoded_bound(hypergraph, distance_type, max_distance)
+        minimal_distances = {vertex: distance for vertex, distance in minimal_distances.items() if distance <= bound}
+    return _vertex_distances(hypergraph, minimal_distances, _decoder(hypergraph, distance_type), encoded)
+
+
+def _time_ordered_groups(hypergraph: TimeVaryingHypergraph, window=None):
+    order = hypergraph.window(*window) if window else hypergraph.timing_index().order
+    bounds = np.flatnonzero(np.diff(hypergraph.timing_array()[order])) + 1
+    return np.split(order, bounds) if len(order) else []
+
+
+def all_sources_foremost(hypergraph: TimeVaryingHypergraph, sources=None, window=None, encoded=False):
+    hedge_offsets, hedge_vertices = map(memoryview, hypergraph.hyperedge_incidence())
+    vertex_ids = hypergraph.vertex_ids()
+    if sources is None:
+        sources = vertex_ids
+    timings = hypergraph.timing_array().tolist() if encoded else hypergraph.timing_values()
+    targets = range(len(vertex_ids)) if encoded else vertex_ids
+
+    # bit k of reached[v] is set once sources[k] reached vertex v
+    reached = [0] * len(vertex_ids)
+    for k, source_vertex in enumerate(sources):
+        reached[hypergraph.vertex_index(source_vertex)] |= 1 << k
+    arrivals: list = [{} for _ in sources]
+
+    for group in _time_ordered_groups(hypergraph, window):
+        # channels with equal timings cannot extend each other, so all unions are taken before any update
+        unions = []
+        for hedge in group.tolist():
+            members = hedge_vertices[hedge_offsets[hedge]:hedge_offsets[hedge + 1]]
+            union = 0
+            for vertex in members:
+                union |= reached[vertex]
+            if union:
+                unions += [(members, union, timings[hedge])]
+        for members, union, timing in unions:
+            for vertex in members:
+                new = union & ~reached[vertex]
+                if new:
+                    reached[vertex] |= new
+                    target = targets[vertex]
+                    while new:
+                        lowest = new & -new
+                        arrivals[lowest.bit_length() - 1][target] = timing
+                        new ^= lowest
+
+    return dict(zip(sources, arrivals))
+
+
+def _reached_bitsets(hypergraph: TimeVaryingHypergraph, sources, window=None):
+    hedge_offsets, hedge_vertices = hypergraph.hyperedge_incidence()
+    source_indices = np.array([hypergraph.vertex_index(source_vertex) for source_vertex in sources], dtype=np.int64)
+
+    # row v holds one bit per source (64 sources per uint64 word), set once that source reached v
+    reached = np.zeros((len(hypergraph.vertex_ids()), max(1, -(-len(sources) // 64))), dtype=np.uint64)
+    positions = np.arange(len(sources))
+    reached[source_indices, positions // 64] |= np.left_shift(np.uint64(1), (positions % 64).astype(np.uint64))
+
+    for group in _time_ordered_groups(hypergraph, window):
+        unions = []
+        for hedge in group.tolist():
+            members = hedge_vertices[hedge_offsets[hedge]:hedge_offsets[hedge + 1]]
+            unions += [(members, np.bitwise_or.reduce(reached[members], axis=0))]
+        for members, union in unions:
+            reached[members] |= union
+    return source_indices, reached
+
+
+def _unpack_bitsets(bitsets, count):
+    return np.unpackbits(bitsets.astype('<u8', copy=False).view(np.uint8), axis=1, count=count, bitorder='little')
+
+
+def reachability_matrix(hypergraph: TimeVaryingHypergraph, sources=None, window=None):
+    if sources is None:
+        sources = hypergraph.vertex_ids()
+    source_indices, reached = _reached_bitsets(hypergraph, sources, window)
+    matrix = _unpack_bitsets(reached, len(sources)).T.astype(bool)
+    matrix[np.arange(len(sources)), source_indices] = False
+    return matrix
+
+
+def reachable_counts(hypergraph: TimeVaryingHypergraph, sources=None, chunk_size=4096, window=None):
+    if sources is None:
+        sources = hypergraph.vertex_ids()
+    _, reached = _reached_bitsets(hypergraph, sources, window)
+    counts = np.zeros(len(sources), dtype=np.int64)
+    for start in range(0, len(reached), chunk_size):
+        counts += _unpack_bitsets(reached[start:start + chunk_size], len(sources)).sum(axis=0, dtype=np.int64)
+    return dict(zip(sources, (counts - 1).tolist()))
+
+
+def class_distance(hypergraph: TimeVaryingHypergraph, vertex, distance_type: DistanceType):
+    # distance between two vertices with the same hyperedges: each reaches the other through its own first hyperedge
+    match distance_type:
+        case DistanceType.SHORTEST:
+            return 1
+        case DistanceType.FASTEST:
+            return hypergraph.timing_codec().decode_duration(0)
+        case DistanceType.FOREMOST:
+            offsets, hedges = hypergraph.vertex_incidence()
+            return hypergraph.timing_codec().decode(int(hypergraph.timing_array()[hedges[offsets[hypergraph.vertex_index(vertex)]]]))
+
 
-    return minimal_distances
+def expand_classes(hypergraph: TimeVaryingHypergraph, classes: dict, distance_type: DistanceType, results: dict):
+    # turns the distances of class representatives in a collapsed hypergraph into the distances of all class members
+    expanded = {}
+    for representative, distances in results.items():
+        targets = {member: distance for target, distance in distances.items() for member in classes[target]}
+        members = classes[representative]
+        if len(members) == 1:
+            expanded[representative] = targets
+            continue
+        distance = class_distance(hypergraph, representative, distance_type)
+        for source in members:
+            expanded[source] = {**targets, **{member: distance for member in members if member != source}}
+    return expanded
@@ -1,7 +1,19 @@
-from datetime import datetime
-from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from collections import namedtuple
+from collections.abc import Set
+from fractions import Fraction
+from functools import cached_property
+from operator import index
 from pathlib import Path
 import bz2
+import errno
+import hashlib
+import math
+import numbers
+import os
+import shutil
+
+import numpy as np
 
 try:
     import orjson as json
@@ -9,46 +21,481 @@ except ImportError:
     import json
 
 
+EPOCH = datetime(1970, 1, 1)
+UTC_EPOCH = EPOCH.replace(tzinfo=timezone.utc)
+ZERO = timedelta(0)
+MICROSECOND = timedelta(microseconds=1)
+SECOND = timedelta(seconds=1)
+
+Incidence = namedtuple('Incidence', ['offsets', 'indices'])
+TimingIndex = namedtuple('TimingIndex', ['order', 'timings'])
+ARRAYS = ('hyperedge_offsets', 'hyperedge_vertices', 'vertex_offsets', 'vertex_hyperedges', 'successor_offsets', 'successors', 'timings')
+
+
 class EntityNotFound(Exception):
     pass
 
 
+class StaleCache(Exception):
+    pass
+
+
+def file_hash(file_path):
+    digest = hashlib.sha256()
+    with Path(file_path).open('rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _dump_json(data):
+    dumped = json.dumps(data)
+    return dumped if isinstance(dumped, bytes) else dumped.encode()
+
+
+def read_json(file_path):
+    # bz2-compressed for a .bz2 suffix
+    file_path = Path(file_path)
+    with file_path.open('rb') as file:
+        if file_path.suffix == '.bz2':
+            return json.loads(bz2.decompress(file.read()))
+        return json.loads(file.read())
+
+
+def write_json(file_path, data, compress=None):
+    # compressed with bz2 for a .bz2 suffix unless compress says otherwise
+    file_path = Path(file_path)
+    dumped = _dump_json(data)
+    file_path.write_bytes(bz2.compress(dumped) if (file_path.suffix == '.bz2' if compress is None else compress) else dumped)
+
+
+class EntityView(Set):
+    # read-only set over a slice of interned ids; avoids building a new set per accessor call
+    __slots__ = ('_ids', '_positions', '_indices')
+
+    def __init__(self, ids, positions, indices):
+        # positions maps each id to its index in ids
+        self._ids = ids
+        self._positions = positions
+        self._indices = indices
+
+    def __iter__(self):
+        ids = self._ids
+        for i in self._indices:
+            yield ids[i]
+
+    def __len__(self):
+        return len(self._indices)
+
+    def __contains__(self, entity):
+        # one dict lookup of the interned id, then a vectorized scan of the slice
+        i = self._positions.get(entity)
+        return i is not None and bool((self._indices == i).any())
+
+    def __repr__(self):
+        return repr(set(self))
+
+    @classmethod
+    def _from_iterable(cls, it):
+        # operators return plain sets, as the accessors did before the views
+        return set(it)
+
+    def union(self, *others):
+        return set(self).union(*others)
+
+    def intersection(self, *others):
+        return set(self).intersection(*others)
+
+    def difference(self, *others):
+        return set(self).difference(*others)
+
+    def symmetric_difference(self, other):
+        return set(self).symmetric_difference(other)
+
+    def issubset(self, other):
+        return set(self).issubset(other)
+
+    def issuperset(self, other):
+        return set(self).issuperset(other)
+
+    def copy(self):
+        return set(self)
+
+
+def _integral(timing):
+    # integers, and other numbers with an integral value such as 2.0
+    try:
+        return index(timing)
+    except TypeError:
+        pass
+    if isinstance(timing, numbers.Real) and math.isfinite(timing) and timing == int(timing):
+        return int(timing)
+    raise ValueError(f'Timing {timing!r} is neither a datetime nor an integral number')
+
+
+def _is_integral(timing):
+    try:
+        _integral(timing)
+    except ValueError:
+        return False
+    return True
+
+
+def _exact(timing):
+    # a number as the decimal it prints as, so that 0.1 is one tenth
+    if not isinstance(timing, numbers.Real):
+        raise ValueError(f'Timing {timing!r} is neither a datetime nor a number')
+    return Fraction(timing) if isinstance(timing, numbers.Rational) else Fraction(str(timing))
+
+
+class TimingCodec:
+    # maps timings to int64 multiples of a resolution; datetime timings count from EPOCH, timezone-aware ones from
+    # UTC_EPOCH and are decoded at the UTC offset of the first timing, integral numbers are kept as integers, and other
+    # numbers are multiples of a Fraction decoded to floats
+    def __init__(self, timing_type=int, resolution=None, tzinfo=None):
+        self.timing_type = timing_type
+        self.resolution = resolution
+        self.tzinfo = tzinfo
+        self._epoch = EPOCH if tzinfo is None else UTC_EPOCH
+
+    @classmethod
+    def for_timings(cls, timings: list, resolution=None):
+        if not timings or not isinstance(timings[0], datetime):
+            if resolution is None and all(map(_is_integral, timings)):
+                return cls(int)
+            # the coarsest resolution all timings are multiples of
+            return cls(float, _exact(resolution) if resolution else Fraction(1, math.lcm(*(_exact(timing).denominator for timing in timings))))
+        codec = cls(datetime, resolution, None if timings[0].tzinfo is None else timezone(timings[0].utcoffset()))
+        if resolution is None:
+            codec.resolution = SECOND if all(codec._since_epoch(timing) % SECOND == ZERO for timing in timings) else MICROSECOND
+        return codec
+
+    def _since_epoch(self, timing):
+        if self.timing_type is float:
+            return _exact(timing)
+        if (timing.tzinfo is None) != (self.tzinfo is None):
+            raise ValueError(f'Timing {timing} mixes timezone-aware and naive datetimes')
+        return timing - self._epoch
+
+    def encode(self, timing):
+        if self.timing_type is int:
+            return _integral(timing)
+        value, remainder = divmod(self._since_epoch(timing), self.resolution)
+        if remainder:
+            raise ValueError(f'Timing {timing} is not a multiple of the resolution {self.resolution}')
+        return int(value)
+
+    def encode_bound(self, timing, round_up=False):
+        # window bounds need not be multiples of the resolution; a lower bound rounds up, an upper bound down
+        if self.timing_type is int:
+            return math.ceil(timing) if round_up else math.floor(timing)
+        value, remainder = divmod(self._since_epoch(timing), self.resolution)
+        return int(value) + 1 if remainder and round_up else int(value)
+
+    def encode_duration(self, duration):
+        # durations in whole resolutions, rounded down like an upper bound
+        if self.timing_type is int:
+            return math.floor(duration)
+        if self.timing_type is float:
+            return int(_exact(duration) // self.resolution)
+        return duration // self.resolution
+
+    def decode(self, value):
+        if self.timing_type is int:
+            return value
+        if self.timing_type is float:
+            return value * self.resolution.numerator / self.resolution.denominator
+        if self.tzinfo is not None:
+            return (UTC_EPOCH + self.resolution * value).astimezone(self.tzinfo)
+        return EPOCH + self.resolution * value
+
+    def decode_duration(self, value):
+        if self.timing_type is int:
+            return value
+        if self.timing_type is float:
+            return value * self.resolution.numerator / self.resolution.denominator
+        return self.resolution * value
+
+    def to_json(self):
+        if self.timing_type is float:
+            return {'timing_type': 'float', 'resolution': str(self.resolution)}
+        utc_offset = None if self.tzinfo is None else self.tzinfo.utcoffset(None) // MICROSECOND
+        return {'timing_type': self.timing_type.__name__, 'resolution': self.resolution // MICROSECOND if self.resolution else None, 'utc_offset': utc_offset}
+
+    @classmethod
+    def from_json(cls, data):
+        if data['timing_type'] == 'int':
+            return cls(int)
+        if data['timing_type'] == 'float':
+            return cls(float, Fraction(data['resolution']))
+        tzinfo = None if data.get('utc_offset') is None else timezone(MICROSECOND * data['utc_offset'])
+        return cls(datetime, MICROSECOND * (data.get('resolution') or 1), tzinfo)
+
+
+def _complete_cache(path, source_hash):
+    try:
+        meta = json.loads((Path(path)/'meta.json').read_bytes())
+    except (FileNotFoundError, ValueError):
+        return False
+    return meta.get('source_hash') == source_hash and all((Path(path)/f'{key}.npy').exists() for key in ARRAYS)
+
+
 class TimeVaryingHypergraph:
-    def __init__(self, hedges: dict, timings: dict):
-        self._vertices = defaultdict(list)
-        for hedge, _vertices in hedges.items():
-            for vertex in _vertices:
-                self._vertices[vertex] += [hedge]
+    def __init__(self, hedges: dict, timings: dict, resolution=None):
+        self._hedge_ids = tuple(hedges)
+        vertex_index: dict = {}
+
+        hedge_offsets = [0]
+        hedge_vertices: list = []
+        for _vertices in hedges.values():
+            members = {vertex_index.setdefault(vertex, len(vertex_index)) for vertex in _vertices}
+            hedge_vertices += sorted(members)
+            hedge_offsets += [len(hedge_vertices)]
+        self._vertex_ids = tuple(vertex_index)
+        self._vertex_index = vertex_index
+
+        timing_values = [timings[hedge] for hedge in self._hedge_ids]
+        self._timing_codec = TimingCodec.for_timings(timing_values, resolution)
+        self._timing_array = np.array([self._timing_codec.encode(timing) for timing in timing_values], dtype=np.int64)
+
+        self._hedge_offsets = np.array(hedge_offsets, dtype=np.int64)
+        self._hedge_vertices = np.array(hedge_vertices, dtype=np.int32)
+        self._build_vertex_incidence()
+        self._build_successor_incidence()
+
+    @classmethod
+    def from_arrays(cls, vertex_ids, hedge_ids, arrays: dict, timing_codec):
+        hypergraph = cls.__new__(cls)
+        hypergraph._vertex_ids = tuple(vertex_ids)
+        hypergraph._hedge_ids = tuple(hedge_ids)
+        hypergraph._hedge_offsets = arrays['hyperedge_offsets']
+        hypergraph._hedge_vertices = arrays['hyperedge_vertices']
+        hypergraph._vertex_offsets = arrays['vertex_offsets']
+        hypergraph._vertex_hedges = arrays['vertex_hyperedges']
+        hypergraph._successor_offsets = arrays['successor_offsets']
+        hypergraph._successors = arrays['successors']
+        hypergraph._timing_array = arrays['timings']
+        hypergraph._timing_codec = timing_codec
+        return hypergraph
+
+    def arrays(self):
+        return {
+            'hyperedge_offsets': self._hedge_offsets,
+            'hyperedge_vertices': self._hedge_vertices,
+            'vertex_offsets': self._vertex_offsets,
+            'vertex_hyperedges': self._vertex_hedges,
+            'successor_offsets': self._successor_offsets,
+            'successors': self._successors,
+            'timings': self._timing_array,
+        }
+
+    def save(self, path, source_hash=None):
+        # columnar binary format: one .npy file per array, the id tables, and the hash of the data it was built from
+        path = Path(path)
+        # per process, so shards started together on one machine do not write into each other's cache
+        temporary_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        shutil.rmtree(temporary_path, ignore_errors=True)
+        temporary_path.mkdir(parents=True)
+        for key, array in self.arrays().items():
+            np.save(temporary_path/f'{key}.npy', array)
+        (temporary_path/'ids.json').write_bytes(_dump_json([list(self._vertex_ids), list(self._hedge_ids)]))
+        (temporary_path/'meta.json').write_bytes(_dump_json({**self._timing_codec.to_json(), 'source_hash': source_hash}))
+        # renaming a directory is atomic but fails while another one is in place: a complete cache from the same data,
+        # e.g. published by a concurrent process, is kept; any other is first moved aside, so it is never half-deleted
+        while True:
+            try:
+                temporary_path.rename(path)
+                return
+            except OSError as error:
+                if error.errno not in (errno.ENOTEMPTY, errno.EEXIST):
+                    raise
+            if source_hash is not None and _complete_cache(path, source_hash):
+                shutil.rmtree(temporary_path)
+                return
+            stale_path = path.with_name(f'{path.name}.{os.getpid()}.stale')
+            try:
+                path.rename(stale_path)
+            except FileNotFoundError:  # moved aside by another process
+                continue
+            shutil.rmtree(stale_path)
+
+    @classmethod
+    def load(cls, path, source=None, **attributes):
+        path = Path(path)
+        meta = json.loads((path/'meta.json').read_bytes())
+        if source is not None and meta['source_hash'] != file_hash(source):
+            raise StaleCache(f'{path} was not built from the current {source}')
+        if not all((path/f'{key}.npy').exists() for key in ARRAYS):
+            raise StaleCache(f'{path} was written by an older version')
+        vertex_ids, hedge_ids = json.loads((path/'ids.json').read_bytes())
+        arrays = {key: np.load(path/f'{key}.npy', mmap_mode='r') for key in ARRAYS}
+        return cls.from_arrays(vertex_ids, hedge_ids, arrays, TimingCodec.from_json(meta), **attributes)
+
+    @cached_property
+    def _vertex_index(self):
+        return {vertex: i for i, vertex in enumerate(self._vertex_ids)}
+
+    @cached_property
+    def _hedge_index(self):
+        return {hedge: i for i, hedge in enumerate(self._hedge_ids)}
+
+    def _build_vertex_incidence(self):
+        # the hyperedges of each vertex are kept in time order
+        hedge_of_member = np.repeat(np.arange(len(self._hedge_ids), dtype=np.int32), np.diff(self._hedge_offsets))
+        order = np.lexsort((self._timing_array[hedge_of_member], self._hedge_vertices))
+        self._vertex_hedges = hedge_of_member[order]
+        self._vertex_offsets = np.zeros(len(self._vertex_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self._hedge_vertices, minlength=len(self._vertex_ids)), out=self._vertex_offsets[1:])
+
+    def _build_successor_incidence(self):
+        # temporal line graph: for each hyperedge, the strictly later hyperedges sharing a vertex with it, deduplicated and in time order
+        num_hedges, num_members = len(self._hedge_ids), len(self._vertex_hedges)
+        member_timings = self._timing_array[self._vertex_hedges]
+        member_vertices = np.repeat(np.arange(len(self._vertex_ids)), np.diff(self._vertex_offsets))
+        run_starts = np.ones(num_members, dtype=bool)
+        run_starts[1:] = (member_vertices[1:] != member_vertices[:-1]) | (member_timings[1:] != member_timings[:-1])
+        # the later hyperedges of a vertex start after the run of its hyperedges with equal timing
+        later_starts = np.append(np.flatnonzero(run_starts)[1:], num_members)[np.cumsum(run_starts) - 1].tolist()
+        later_ends = self._vertex_offsets[1:][member_vertices].tolist()
+
+        by_rank = np.argsort(self._timing_array, kind='stable').astype(np.int32)
+        rank = np.empty(num_hedges, dtype=np.int32)
+        rank[by_rank] = np.arange(num_hedges, dtype=np.int32)
+        ranked_members = rank[self._vertex_hedges]
+
+        memberships = np.argsort(self._vertex_hedges, kind='stable').tolist()
+        membership_offsets = np.zeros(num_hedges + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self._vertex_hedges, minlength=num_hedges), out=membership_offsets[1:])
+        membership_offsets = membership_offsets.tolist()
+
+        successors = []
+        self._successor_offsets = np.zeros(num_hedges + 1, dtype=np.int64)
+        for hedge in range(num_hedges):
+            later = [ranked_members[later_starts[i]:later_ends[i]] for i in memberships[membership_offsets[hedge]:membership_offsets[hedge + 1]]]
+            successors += [by_rank[np.unique(np.concatenate(later))] if later else by_rank[:0]]
+            self._successor_offsets[hedge + 1] = self._successor_offsets[hedge] + len(successors[-1])
+        self._successors = np.concatenate(successors) if successors else by_rank[:0]
+
+    @cached_property
+    def _timing_index(self):
+        order = np.argsort(self._timing_array, kind='stable')
+        return TimingIndex(order, self._timing_array[order])
 
-        self._hedges = hedges
-        self._timings = timings
+    @cached_property
+    def _timing_values(self):
+        return tuple(map(self._timing_codec.decode, self._timing_array.tolist()))
 
     def timings(self, entity=None):
         if entity is None:
-            return self._timings
-        return self._timings[entity]
+            return dict(zip(self._hedge_ids, self._timing_values))
+        return self._timing_values[self._hedge_index[entity]]
 
     def vertices(self, hedge=None):
         if hedge is None:
-            return set(self._vertices)
-        if hedge in self._hedges:
-            return set(self._hedges[hedge])
+            return self._vertex_index.keys()
+        if hedge in self._hedge_index:
+            i = self._hedge_index[hedge]
+            return EntityView(self._vertex_ids, self._vertex_index, self._hedge_vertices[self._hedge_offsets[i]:self._hedge_offsets[i + 1]])
         raise EntityNotFound(f'Unknown hyperedge {hedge}')
 
     def hyperedges(self, vertex=None):
         if vertex is None:
-            return set(self._hedges)
-        if vertex in self._vertices:
-            return set(self._vertices[vertex])
+            return self._hedge_index.keys()
+        if vertex in self._vertex_index:
+            i = self._vertex_index[vertex]
+            return EntityView(self._hedge_ids, self._hedge_index, self._vertex_hedges[self._vertex_offsets[i]:self._vertex_offsets[i + 1]])
         raise EntityNotFound(f'Unknown vertex {vertex}')
 
+    def collapse(self):
+        # structural equivalence: vertices with the same hyperedges are merged into their first one, and then
+        # hyperedges with the same vertices and timing as well; returns the collapsed hypergraph and its vertex classes
+        classes: dict = {}
+        for v, vertex in enumerate(self._vertex_ids):
+            classes.setdefault(tuple(sorted(self._vertex_hedges[self._vertex_offsets[v]:self._vertex_offsets[v + 1]].tolist())), []).append(vertex)
+        representatives = {}
+        for members in classes.values():
+            representatives.update(dict.fromkeys(members, members[0]))
+        hedges: dict = {}
+        timings: dict = {}
+        seen = set()
+        timing_array = self._timing_array.tolist()
+        for i, hedge in enumerate(self._hedge_ids):
+            vertices = tuple(dict.fromkeys(representatives[self._vertex_ids[v]] for v in self._hedge_vertices[self._hedge_offsets[i]:self._hedge_offsets[i + 1]]))
+            if (vertices, timing_array[i]) not in seen:
+                seen.add((vertices, timing_array[i]))
+                hedges[hedge] = vertices
+                timings[hedge] = self._timing_values[i]
+        collapsed = type(self)(hedges, timings, resolution=self._timing_codec.resolution)
+        return collapsed, {members[0]: tuple(members) for members in classes.values()}
+
+    # integer-indexed backend used by the minimal path engines
+
+    def vertex_ids(self):
+        return self._vertex_ids
+
+    def hyperedge_ids(self):
+        return self._hedge_ids
+
+    def vertex_index(self, vertex):
+        if vertex in self._vertex_index:
+            return self._vertex_index[vertex]
+        raise EntityNotFound(f'Unknown vertex {vertex}')
+
+    def hyperedge_index(self, hedge):
+        if hedge in self._hedge_index:
+            return self._hedge_index[hedge]
+        raise EntityNotFound(f'Unknown hyperedge {hedge}')
+
+    def hyperedge_incidence(self):
+        return Incidence(self._hedge_offsets, self._hedge_vertices)
+
+    def vertex_incidence(self):
+        return Incidence(self._vertex_offsets, self._vertex_hedges)
+
+    def successor_incidence(self):
+        return Incidence(self._successor_offsets, self._successors)
+
+    def timing_array(self):
+        return self._timing_array
+
+    def timing_index(self):
+        return self._timing_index
+
+    def window_bounds(self, start=None, end=None):
+        # encoded bounds of the closed window [start, end]; None leaves a side open
+        return (None if start is None else self._timing_codec.encode_bound(start, round_up=True),
+                None if end is None else self._timing_codec.encode_bound(end))
+
+    def window(self, start=None, end=None):
+        # hyperedges with start <= timing <= end in time order, as a view on the timing index
+        order, timings = self._timing_index
+        start, end = self.window_bounds(start, end)
+        return order[0 if start is None else np.searchsorted(timings, start):len(order) if end is None else np.searchsorted(timings, end, side='right')]
+
+    def timing_codec(self):
+        return self._timing_codec
+
+    def timing_values(self):
+        return self._timing_values
+
 
 class CommunicationNetwork(TimeVaryingHypergraph):
 
-    def __init__(self, channels, channel_timings, name=None):
-        super().__init__(channels, channel_timings)
+    def __init__(self, channels, channel_timings, name=None, resolution=None):
+        super().__init__(channels, channel_timings, resolution)
         self.name = name
 
+    @classmethod
+    def from_arrays(cls, vertex_ids, hedge_ids, arrays: dict, timing_codec, name=None):
+        communication_network = super().from_arrays(vertex_ids, hedge_ids, arrays, timing_codec)
+        communication_network.name = name
+        return communication_network
+
+    def collapse(self):
+        collapsed, classes = super().collapse()
+        collapsed.name = self.name
+        return collapsed, classes
+
     def channels(self, participant=None):
         return self.hyperedges(participant)
 
@@ -56,14 +503,18 @@ class CommunicationNetwork(TimeVaryingHypergraph):
         return self.vertices(channel)
 
     @classmethod
-    def from_json(cls, file_path, name=None):
-        file_path = Path(file_path)
-        with file_path.open('rb') as file:
-            if file_path.suffix == '.bz2':
-                raw_data = json.loads(bz2.decompress(file.read()))
-            else:
-                raw_data = json.loads(file.read())
-            hedges = {str(chan_id): set(channel['participants']) for chan_id, channel in raw_data.items()}
-            timings = {str(chan_id): datetime.fromisoformat(channel['end']) for chan_id, channel in raw_data.items()}
-
-        return cls(hedges, timings, name=name)
+    def from_json(cls, file_path, name=None, resolution=None):
+        raw_data = read_json(file_path)
+        hedges = {str(chan_id): channel['participants'] for chan_id, channel in raw_data.items()}
+        timings = {str(chan_id): datetime.fromisoformat(channel['end']) for chan_id, channel in raw_data.items()}
+
+        return cls(hedges, timings, name=name, resolution=resolution)
+
+    @classmethod
+    def from_json_cached(cls, file_path, cache_path, name=None):
+        try:
+            return cls.load(cache_path, source=file_path, name=name)
+        except (FileNotFoundError, StaleCache):
+            communication_network = cls.from_json(file_path, name=name)
+            communication_network.save(cache_path, source_hash=file_hash(file_path))
+            return communication_network
@@ -0,0 +1,180 @@
+import sys
+import time
+import pickle
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .minimal_paths import all_sources_foremost, SearchCounters, DistanceType
+from .summary import DistanceSummary
+from .results import ResultMatrices
+
+
+FOREMOST_BATCH_SIZE = 1024  # sources propagated together in one chronological sweep
+MAX_CHUNK_SIZE = 256  # sources per single-source Dijkstra task
+CHUNKS_PER_WORKER = 4
+
+_attached: dict = {'handle': None, 'hypergraph': None, 'segments': []}
+
+
+def _open_segment(name):
+    # attached segments are left to the publishing process where Python (3.13 on) can be told so
+    return shared_memory.SharedMemory(name=name, **({'track': False} if sys.version_info >= (3, 13) else {}))
+
+
+class SharedHypergraph:
+    # publishes a hypergraph once into shared memory; its handle is the name of a small header segment
+    def __init__(self, hypergraph):
+        self._segments = []
+        layout = {}
+        for key, array in hypergraph.arrays().items():
+            segment = self._create(array.nbytes)
+            np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf)[...] = array
+            layout[key] = (segment.name, array.dtype.str, array.shape)
+        attributes = {'name': hypergraph.name} if hasattr(hypergraph, 'name') else {}
+        header = pickle.dumps((type(hypergraph), hypergraph.vertex_ids(), hypergraph.hyperedge_ids(), hypergraph.timing_codec(), attributes, layout), protocol=5)
+        segment = self._create(len(header))
+        segment.buf[:len(header)] = header
+        self.handle = segment.name
+
+    def _create(self, size):
+        segment = shared_memory.SharedMemory(create=True, size=max(1, size))
+        self._segments += [segment]
+        return segment
+
+    def close(self):
+        for segment in self._segments:
+            segment.close()
+            segment.unlink()
+        self._segments = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+def attach(handle):
+    segments = [_open_segment(handle)]
+    cls, vertex_ids, hedge_ids, timing_codec, attributes, layout = pickle.loads(segments[0].buf)
+    arrays = {}
+    for key, (name, dtype, shape) in layout.items():
+        segments += [_open_segment(name)]
+        arrays[key] = np.ndarray(shape, dtype=dtype, buffer=segments[-1].buf)
+        arrays[key].flags.writeable = False
+    return cls.from_arrays(vertex_ids, hedge_ids, arrays, timing_codec, **attributes), segments
+
+
+def _shared_hypergraph(handle):
+    # workers of the persistent pool keep the most recently used network attached
+    if _attached['handle'] != handle:
+        segments = _attached['segments']
+        # no array may reference the segments of the previous network once they are closed
+        _attached.update(handle=None, hypergraph=None, segments=[])
+        for segment in segments:
+            segment.close()
+        hypergraph, segments = attach(handle)
+        _attached.update(handle=handle, hypergraph=hypergraph, segments=segments)
+    return _attached['hypergraph']
+
+
+def single_source_task(handle, single_source_dijkstra, sources, distance_type, instrument=False, targets=None):
+    # instrumented tasks return the distances, a metrics record per source, and their compute time
+    hypergraph = _shared_hypergraph(handle)
+    if not instrument:
+        return {source: single_source_dijkstra(hypergraph, source, distance_type, targets=targets) for source in sources}
+    task_start = time.perf_counter()
+    results, records = {}, []
+    for source in sources:
+        counters = SearchCounters()
+        start = time.perf_counter()
+        results[source] = single_source_dijkstra(hypergraph, source, distance_type, counters=counters, targets=targets)
+        records += [{'source': source, 'seconds': time.perf_counter() - start, **counters.as_dict()}]
+    return results, records, time.perf_counter() - task_start
+
+
+def foremost_task(handle, sources, instrument=False, targets=None):
+    # the sources of a batch share one sweep, so only their reached participants are recorded; the sweep reaches all
+    # participants anyway, so targets only filter its arrivals
+    start = time.perf_counter()
+    results = all_sources_foremost(_shared_hypergraph(handle), sources)
+    if targets is not None:
+        results = {source: {target: arrival for target, arrival in arrivals.items() if target in targets} for source, arrivals in results.items()}
+    if not instrument:
+        return results
+    return results, [{'source': source, 'labels': len(arrivals)} for source, arrivals in results.items()], time.perf_counter() - start
+
+
+def summary_task(handle, single_source_dijkstra, sources, distance_type, edges):
+    # reduces the distances of each source right away, so only the fixed-size summary is sent back
+    hypergraph = _shared_hypergraph(handle)
+    summary = DistanceSummary(edges)
+    if distance_type is DistanceType.FOREMOST:
+        for source, distances in all_sources_foremost(hypergraph, sources).items():
+            summary.add(source, distances)
+    else:
+        for source in sources:
+            summary.add(source, single_source_dijkstra(hypergraph, source, distance_type))
+    return summary
+
+
+def matrix_task(handle, single_source_dijkstra, sources, distance_type, directory):
+    # writes the rows of its sources straight into the memory-mapped result matrix and only returns the sources
+    hypergraph = _shared_hypergraph(handle)
+    if distance_type is DistanceType.FOREMOST:
+        results = all_sources_foremost(hypergraph, sources, encoded=True)
+    else:
+        results = {source: single_source_dijkstra(hypergraph, source, distance_type, encoded=True) for source in sources}
+    ResultMatrices(directory).write_rows(distance_type, results)
+    return sources
+
+
+def estimate_costs(hypergraph, sources):
+    # a source can only reach channels not earlier than its own first channel; their number bounds the search
+    offsets, hedges = hypergraph.vertex_incidence()
+    timing_array = hypergraph.timing_array()
+    sorted_timings = np.sort(timing_array)
+    costs = np.empty(len(sources), dtype=np.int64)
+    for i, source in enumerate(sources):
+        v = hypergraph.vertex_index(source)
+        own_timings = timing_array[hedges[offsets[v]:offsets[v + 1]]]
+        costs[i] = len(sorted_timings) - np.searchsorted(sorted_timings, own_timings.min()) + len(own_timings)
+    return costs
+
+
+def cost_ordered_chunks(sources, costs, num_workers, chunks_per_worker=CHUNKS_PER_WORKER, max_chunk_size=MAX_CHUNK_SIZE):
+    # guided self-scheduling on estimated costs: heaviest sources first, each chunk takes a fixed share of the remaining work
+    order = np.argsort(-costs, kind='stable')
+    remaining = int(costs.sum())
+    chunks = []
+    chunk: list = []
+    chunk_cost = 0
+    for i in order.tolist():
+        chunk += [sources[i]]
+        chunk_cost += int(costs[i])
+        if chunk_cost * chunks_per_worker * num_workers >= remaining or len(chunk) >= max_chunk_size:
+            chunks += [tuple(chunk)]
+            remaining -= chunk_cost
+            chunk, chunk_cost = [], 0
+    if chunk:
+        chunks += [tuple(chunk)]
+    return chunks
+
+
+def schedule(executor, shared_network, hypergraph, sources, distance_type, single_source_dijkstra, num_workers, summary_edges=None, matrix_directory=None, instrument=False, targets=None):
+    # with summary_edges, tasks return a DistanceSummary over their sources instead of their distances;
+    # with matrix_directory, they write their distances into the ResultMatrices there and return their sources;
+    # with instrument, they also return per-source metrics and their compute time; with targets, only their distances
+    if distance_type is DistanceType.FOREMOST:
+        batch_size = max(1, min(FOREMOST_BATCH_SIZE, -(-len(sources) // num_workers)))
+        chunks = [sources[i:i + batch_size] for i in range(0, len(sources), batch_size)]
+    else:
+        chunks = cost_ordered_chunks(sources, estimate_costs(hypergraph, sources), num_workers)
+    if summary_edges is not None:
+        return {executor.submit(summary_task, shared_network.handle, single_source_dijkstra, chunk, distance_type, summary_edges): chunk for chunk in chunks}
+    if matrix_directory is not None:
+        return {executor.submit(matrix_task, shared_network.handle, single_source_dijkstra, chunk, distance_type, str(matrix_directory)): chunk for chunk in chunks}
+    if distance_type is DistanceType.FOREMOST:
+        return {executor.submit(foremost_task, shared_network.handle, chunk, instrument, targets): chunk for chunk in chunks}
+    return {executor.submit(single_source_task, shared_network.handle, single_source_dijkstra, chunk, distance_type, instrument, targets): chunk for chunk in chunks}
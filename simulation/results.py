@@ -0,0 +1,434 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from .model import EPOCH, UTC_EPOCH, MICROSECOND, TimingCodec, file_hash
+from .minimal_paths import DistanceType
+
+# pandas is only imported where data frames are built, so neither the workers nor the writer load it
+
+ROW_DTYPE = np.dtype([('source', '<i4'), ('target', '<i4'), ('distance', '<i8')])
+SHARD_ROWS = 1 << 22
+CHECKPOINT_INTERVAL = 300  # seconds between forced flushes, so little work is lost on interruption
+JOURNAL = 'journal.jsonl'
+MANIFEST = 'manifest.json'
+MATRIX_DTYPES = {DistanceType.SHORTEST: np.dtype('<i2'), DistanceType.FASTEST: np.dtype('<i8'), DistanceType.FOREMOST: np.dtype('<i8')}
+UNREACHABLE = {np.dtype('<i2'): -1, np.dtype('<i8'): np.iinfo(np.int64).min}
+MATRIX_CHUNK_ROWS = 1024  # matrix rows converted at once when building a data frame
+SIGN_BITS = np.iinfo(np.int64).max
+
+
+def _kind(distance):
+    if isinstance(distance, datetime):
+        # timezone-aware arrivals are stored and read back in UTC
+        return 'datetime' if distance.tzinfo is None else 'datetime_utc'
+    if isinstance(distance, timedelta):
+        return 'timedelta'
+    if isinstance(distance, float):
+        return 'float'
+    return 'int'
+
+
+def float_bits(values):
+    # float64 values as int64 that sort like them: their bits, with all but the sign bit flipped for negative values
+    bits = np.asarray(values, dtype=np.float64).view(np.int64)
+    return np.where(bits < 0, bits ^ SIGN_BITS, bits)
+
+
+def _float_values(bits):
+    bits = np.asarray(bits, dtype=np.int64)
+    return np.where(bits < 0, bits ^ SIGN_BITS, bits).view(np.float64)
+
+
+def distance_kind(timing_codec, distance_type: DistanceType):
+    # the kind of the distances of a network with the timings of timing_codec, known before any distance is
+    if distance_type is DistanceType.SHORTEST or timing_codec.timing_type is int:
+        return 'int'
+    if timing_codec.timing_type is float:
+        return 'float'
+    if distance_type is DistanceType.FASTEST:
+        return 'timedelta'
+    return 'datetime' if timing_codec.tzinfo is None else 'datetime_utc'
+
+
+def _encoder(kind):
+    match kind:
+        case 'datetime':
+            return lambda distance: (distance - EPOCH) // MICROSECOND
+        case 'datetime_utc':
+            return lambda distance: (distance - UTC_EPOCH) // MICROSECOND
+        case 'timedelta':
+            return lambda distance: distance // MICROSECOND
+        case 'float':
+            return lambda distance: int(float_bits(distance))
+        case 'int':
+            return int
+
+
+def _decode(values, kind):
+    # same dtypes as pandas infers from the python objects returned by the minimal path engines
+    import pandas as pd
+    match kind:
+        case 'datetime':
+            return pd.array(values.view('M8[us]')).astype(pd.Series([EPOCH]).dtype)
+        case 'datetime_utc':
+            return pd.array(values.view('M8[us]')).tz_localize('UTC')
+        case 'timedelta':
+            return pd.array(values.view('m8[us]')).astype(pd.Series([timedelta(0)]).dtype)
+        case 'float':
+            return _float_values(values)
+        case _:
+            return values
+
+
+class ResultWriter:
+    # streams per-source distances into typed .npy shards, one directory per distance type;
+    # every flushed shard is recorded in a journal, so an interrupted run can resume from it
+    def __init__(self, directory, participants, shard_rows=SHARD_ROWS, checkpoint_interval=CHECKPOINT_INTERVAL, resume=False):
+        self.directory = Path(directory)
+        self._participants = participants
+        self._index = {participant: i for i, participant in enumerate(participants)}
+        self._shard_rows = shard_rows
+        self._checkpoint_interval = checkpoint_interval
+        self._last_checkpoint = time.monotonic()
+        self._buffers: dict = {}
+        self._buffered_rows: dict = {}
+        self._buffered_sources: dict = {}
+        self._encoders: dict = {}
+        self._completed: dict = {distance_type: set() for distance_type in DistanceType}
+        if resume:
+            self._recover()
+        else:
+            shutil.rmtree(self.directory, ignore_errors=True)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _recover(self):
+        shards = set()
+        journal_path = self.directory/JOURNAL
+        if journal_path.exists():
+            for line in journal_path.read_text().splitlines():
+                try:
+                    entry = json.loads(line)
+                except ValueError:  # torn last line
+                    break
+                distance_type = DistanceType[entry['distance_type'].upper()]
+                shards.add((distance_type, entry['shard']))
+                self._completed[distance_type].update(entry['sources'])
+        for distance_type in DistanceType:
+            for shard_path in self._distance_type_path(distance_type).glob('*.*'):
+                if shard_path.suffix == '.tmp' or (shard_path.suffix == '.npy' and (distance_type, shard_path.name) not in shards):
+                    shard_path.unlink()
+
+    def completed(self, distance_type: DistanceType):
+        return {self._participants[i] for i in self._completed[distance_type]}
+
+    def _distance_type_path(self, distance_type: DistanceType):
+        return self.directory/distance_type.name.lower()
+
+    def _encoder(self, distance_type, kind):
+        if distance_type not in self._encoders:
+            path = self._distance_type_path(distance_type)
+            path.mkdir(parents=True, exist_ok=True)
+            if (path/'meta.json').exists():
+                kind = json.loads((path/'meta.json').read_text())['kind']
+            else:
+                (path/'meta.json').write_text(json.dumps({'kind': kind}))
+            self._encoders[distance_type] = _encoder(kind)
+        return self._encoders[distance_type]
+
+    def write(self, distance_type: DistanceType, results: dict):
+        buffer = self._buffers.setdefault(distance_type, [])
+        sources = self._buffered_sources.setdefault(distance_type, [])
+        for source, vertex_distances in results.items():
+            sources += [self._index[source]]
+            if not vertex_distances:
+                continue
+            encode = self._encoder(distance_type, _kind(next(iter(vertex_distances.values()))))
+            rows = np.empty(len(vertex_distances), dtype=ROW_DTYPE)
+            rows['source'] = self._index[source]
+            rows['target'] = np.fromiter((self._index[target] for target in vertex_distances), dtype=np.int32, count=len(rows))
+            rows['distance'] = np.fromiter(map(encode, vertex_distances.values()), dtype=np.int64, count=len(rows))
+            buffer += [rows]
+            self._buffered_rows[distance_type] = self._buffered_rows.get(distance_type, 0) + len(rows)
+        self._checkpoint(distance_type)
+
+    def write_rows(self, distance_type: DistanceType, sources, rows, kind):
+        # already encoded rows, e.g. carried over from an earlier result; sources are participant indices
+        self._encoder(distance_type, kind)
+        self._buffered_sources.setdefault(distance_type, []).extend(sources)
+        self._buffers.setdefault(distance_type, []).append(rows)
+        self._buffered_rows[distance_type] = self._buffered_rows.get(distance_type, 0) + len(rows)
+        self._checkpoint(distance_type)
+
+    def _checkpoint(self, distance_type: DistanceType):
+        if self._buffered_rows.get(distance_type, 0) >= self._shard_rows:
+            self.flush(distance_type)
+        elif time.monotonic() - self._last_checkpoint >= self._checkpoint_interval:
+            self.close()
+
+    def flush(self, distance_type: DistanceType):
+        buffer = self._buffers.pop(distance_type, [])
+        self._buffered_rows.pop(distance_type, None)
+        sources = self._buffered_sources.pop(distance_type, [])
+        if not sources:
+            return
+        path = self._distance_type_path(distance_type)
+        path.mkdir(parents=True, exist_ok=True)
+        shard_path = path/f'{max((int(p.stem) for p in path.glob("*.npy")), default=-1) + 1:06d}.npy'
+        temporary_path = shard_path.with_suffix('.tmp')
+        with temporary_path.open('wb') as file:
+            np.save(file, np.concatenate(buffer) if buffer else np.empty(0, dtype=ROW_DTYPE))
+            file.flush()
+            os.fsync(file.fileno())
+        temporary_path.replace(shard_path)
+        with (self.directory/JOURNAL).open('a') as journal:
+            journal.write(json.dumps({'distance_type': distance_type.name.lower(), 'shard': shard_path.name, 'sources': sources}) + '\n')
+            journal.flush()
+            os.fsync(journal.fileno())
+        self._completed[distance_type].update(sources)
+        self._last_checkpoint = time.monotonic()
+
+    def close(self):
+        for distance_type in list(self._buffered_sources):
+            self.flush(distance_type)
+        self._last_checkpoint = time.monotonic()
+
+
+def read_distances(directory, distance_type: DistanceType):
+    path = Path(directory)/distance_type.name.lower()
+    shards = [np.load(shard_path) for shard_path in sorted(path.glob('*.npy'))]
+    rows = np.concatenate(shards) if shards else np.empty(0, dtype=ROW_DTYPE)
+    kind = json.loads((path/'meta.json').read_text())['kind'] if (path/'meta.json').exists() else 'int'
+    return rows, kind
+
+
+def frame_distances(result, distance_type: DistanceType):
+    # inverse of read_result for one distance type: participant categories, source and target codes and encoded distances
+    import pandas as pd
+    sources, targets = result.index.get_level_values('source'), result.index.get_level_values('target')
+    column = result[distance_type.name.lower()]
+    if isinstance(column.dtype, pd.DatetimeTZDtype):
+        kind, values = 'datetime_utc', column.dt.tz_convert('UTC').dt.tz_localize(None).to_numpy().astype('M8[us]').view(np.int64)
+    elif pd.api.types.is_datetime64_dtype(column.dtype):
+        kind, values = 'datetime', column.to_numpy().astype('M8[us]').view(np.int64)
+    elif pd.api.types.is_timedelta64_dtype(column.dtype):
+        kind, values = 'timedelta', column.to_numpy().astype('m8[us]').view(np.int64)
+    elif pd.api.types.is_float_dtype(column.dtype):
+        kind, values = 'float', float_bits(column.to_numpy(np.float64))
+    else:
+        kind, values = 'int', column.to_numpy(np.int64)
+    return sources.categories, np.asarray(sources.codes), np.asarray(targets.codes), values, kind
+
+
+def _result_frame(participants, distances: dict):
+    # distances maps each distance type to its source codes, target codes, encoded distances and kind
+    import pandas as pd
+    category = pd.api.types.CategoricalDtype(categories=participants, ordered=False)
+    data_frames = []
+    for distance_type, (sources, targets, values, kind) in distances.items():
+        index = pd.MultiIndex.from_arrays([pd.Categorical.from_codes(sources, dtype=category),
+                                           pd.Categorical.from_codes(targets, dtype=category)], names=['source', 'target'])
+        data_frames += [pd.Series(_decode(values, kind), index=index, name=distance_type.name.lower()).sort_index()]
+    return pd.concat(data_frames, axis=1).sort_index()
+
+
+def read_result(directory, participants):
+    distances = {}
+    for distance_type in DistanceType:
+        rows, kind = read_distances(directory, distance_type)
+        distances[distance_type] = (rows['source'], rows['target'], rows['distance'], kind)
+    return _result_frame(participants, distances)
+
+
+def write_result_meta(directory, name, network_hash, appended=()):
+    # the hash of the network file the exported results <name>.csv.bz2 and .pickle.bz2 belong to, and the files of the
+    # channels appended to it since, in order
+    meta = {'network_hash': network_hash, 'appended': [Path(path).relative_to(directory).as_posix() for path in appended]}
+    temporary_path = Path(directory)/f'{name}.meta.json.tmp'
+    temporary_path.write_text(json.dumps(meta), encoding='utf-8')
+    temporary_path.replace(Path(directory)/f'{name}.meta.json')
+
+
+def appended_paths(directory, name, network_path):
+    # the files of the channels appended to network_path by the results of name, none if they belong to another version
+    meta_path = Path(directory)/f'{name}.meta.json'
+    if not meta_path.exists():
+        return []
+    meta = json.loads(meta_path.read_text(encoding='utf-8'))
+    if meta['network_hash'] != file_hash(network_path):
+        return []
+    return [Path(directory)/path for path in meta.get('appended', [])]
+
+
+def appended_path(directory, name, index):
+    return Path(directory)/f'{name}.appended'/f'{index:04d}.json.bz2'
+
+
+def check_result_meta(directory, name, network_path):
+    # results are only updated for the network file they were computed from
+    meta_path = Path(directory)/f'{name}.meta.json'
+    if not meta_path.exists():
+        raise ValueError(f'{meta_path} is missing; recompute the results of {name} before appending to them')
+    if json.loads(meta_path.read_text(encoding='utf-8'))['network_hash'] != file_hash(network_path):
+        raise ValueError(f'The results of {name} were not computed from the current {network_path}')
+
+
+def shard_directory(directory, name, index, count):
+    return Path(directory)/f'{name}.shards'/f'{index:04d}-of-{count:04d}'
+
+
+def write_manifest(path, name, index, count, participants, network_path, writer: ResultWriter):
+    # written once all distance types of a shard are flushed; only shards with a manifest are merged
+    manifest = {'name': name, 'shard': index, 'shards': count, 'participants': len(participants), 'network_hash': file_hash(network_path),
+                'completed': {distance_type.name.lower(): len(writer.completed(distance_type)) for distance_type in DistanceType}}
+    temporary_path = Path(path)/(MANIFEST + '.tmp')
+    temporary_path.write_text(json.dumps(manifest))
+    temporary_path.replace(Path(path)/MANIFEST)
+
+
+def read_shards(directory, name, participants, network_path=None):
+    # the directories of a complete set of shards of the same network that covers every participant exactly once
+    manifests = [json.loads(path.read_text()) for path in sorted((Path(directory)/f'{name}.shards').glob(f'*/{MANIFEST}'))]
+    if not manifests:
+        raise FileNotFoundError(f'no finished shards of {name} in {directory}')
+    count = manifests[0]['shards']
+    if sorted((manifest['shards'], manifest['shard']) for manifest in manifests) != [(count, index) for index in range(count)]:
+        raise ValueError(f'shards of {name} are incomplete or from different splits: {sorted((manifest["shard"], manifest["shards"]) for manifest in manifests)}')
+    hashes = {manifest['network_hash'] for manifest in manifests}
+    if len(hashes) > 1 or (network_path is not None and hashes != {file_hash(network_path)}):
+        raise ValueError(f'shards of {name} were computed from different versions of the network')
+    paths = [shard_directory(directory, name, index, count) for index in range(count)]
+    for distance_type in DistanceType:
+        covered = [ResultWriter(path, participants, resume=True).completed(distance_type) for path in paths]
+        if sum(map(len, covered)) != len(participants) or set().union(*covered) != set(participants):
+            raise ValueError(f'shards of {name} do not cover every participant exactly once for {distance_type.name.lower()} distances')
+    return paths
+
+
+def merge_shards(paths, participants):
+    # the same data frame as read_result on the parts of a single-node run
+    distances = {}
+    for distance_type in DistanceType:
+        rows, kinds = [], set()
+        for path in paths:
+            shard_rows, kind = read_distances(path, distance_type)
+            rows += [shard_rows]
+            if (Path(path)/distance_type.name.lower()/'meta.json').exists():
+                kinds.add(kind)
+        if len(kinds) > 1:
+            raise ValueError(f'shards disagree on the kind of {distance_type.name.lower()} distances: {kinds}')
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=ROW_DTYPE)
+        distances[distance_type] = (rows['source'], rows['target'], rows['distance'], kinds.pop() if kinds else 'int')
+    return _result_frame(participants, distances)
+
+
+class ResultMatrices:
+    # dense n x n store with one memory-mapped .npy matrix per distance type; row and column i belong to participants[i],
+    # unreachable pairs and the diagonal hold UNREACHABLE. Hop counts are int16, temporal distances int64 multiples of
+    # the resolution of the timing codec. Workers open the matrices themselves and write whole rows of their sources
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        meta = json.loads((self.directory/'meta.json').read_text())
+        self.participants = tuple(meta['participants'])
+        self.timing_codec = TimingCodec.from_json(meta['timing_codec'])
+        self._columns = None
+        self._rows = None
+
+    @classmethod
+    def create(cls, directory, hypergraph, participants, resume=False):
+        directory = Path(directory)
+        if resume and (directory/'meta.json').exists():
+            return cls(directory)
+        shutil.rmtree(directory, ignore_errors=True)
+        directory.mkdir(parents=True)
+        # column of each vertex index of the hypergraph
+        index = {participant: i for i, participant in enumerate(participants)}
+        np.save(directory/'columns.npy', np.array([index.get(vertex, -1) for vertex in hypergraph.vertex_ids()], dtype=np.int64))
+        for distance_type, dtype in MATRIX_DTYPES.items():
+            # rows stay unwritten (sparse on most file systems) until a worker fills them
+            np.lib.format.open_memmap(directory/f'{distance_type.name.lower()}.npy', mode='w+', dtype=dtype, shape=(len(participants), len(participants))).flush()
+        np.save(directory/'completed.npy', np.zeros((len(DistanceType), len(participants)), dtype=bool))
+        # written last, so an interrupted creation is started over
+        (directory/'meta.json').write_text(json.dumps({'participants': list(participants), 'timing_codec': hypergraph.timing_codec().to_json()}))
+        return cls(directory)
+
+    def matrix(self, distance_type: DistanceType, mode='r'):
+        return np.load(self.directory/f'{distance_type.name.lower()}.npy', mmap_mode=mode)
+
+    def write_rows(self, distance_type: DistanceType, results: dict):
+        # results map sources to encoded distances by vertex index, as returned by the engines with encoded=True
+        if self._columns is None:
+            self._columns = np.load(self.directory/'columns.npy')
+            self._rows = {participant: i for i, participant in enumerate(self.participants)}
+        matrix = self.matrix(distance_type, 'r+')
+        sentinel = UNREACHABLE[matrix.dtype]
+        for source, distances in results.items():
+            row = np.full(len(self.participants), sentinel, dtype=matrix.dtype)
+            if distances:
+                values = np.fromiter(distances.values(), dtype=np.int64, count=len(distances))
+                if values.max() > np.iinfo(matrix.dtype).max:
+                    raise OverflowError(f'{distance_type.name.lower()} distance {values.max()} of {source} does not fit into {matrix.dtype}')
+                row[self._columns[np.fromiter(distances.keys(), dtype=np.int64, count=len(distances))]] = values
+            matrix[self._rows[source]] = row
+        matrix.flush()
+        del matrix
+
+    def complete(self, distance_type: DistanceType, sources):
+        # marks rows as written once their task has returned
+        index = {participant: i for i, participant in enumerate(self.participants)} if self._rows is None else self._rows
+        completed = np.load(self.directory/'completed.npy', mmap_mode='r+')
+        completed[distance_type.value, [index[source] for source in sources]] = True
+        completed.flush()
+        del completed
+
+    def completed(self, distance_type: DistanceType):
+        completed = np.load(self.directory/'completed.npy')[distance_type.value]
+        return {self.participants[i] for i in np.flatnonzero(completed)}
+
+    def _values(self, kind, values):
+        # matrix entries encoded like the result shards
+        values = values.astype(np.int64)
+        match kind:
+            case 'int':
+                return values
+            case 'float':
+                return float_bits(values * self.timing_codec.resolution.numerator / self.timing_codec.resolution.denominator)
+            case _:
+                return values * (self.timing_codec.resolution // MICROSECOND)
+
+    def distances(self, distance_type: DistanceType):
+        # reachable pairs of the completed rows as source codes, target codes, encoded distances and kind
+        matrix = self.matrix(distance_type)
+        sentinel = UNREACHABLE[matrix.dtype]
+        kind = distance_kind(self.timing_codec, distance_type)
+        rows = np.flatnonzero(np.load(self.directory/'completed.npy')[distance_type.value])
+        sources, targets, values = [], [], []
+        for i in range(0, len(rows), MATRIX_CHUNK_ROWS):
+            chunk = rows[i:i + MATRIX_CHUNK_ROWS]
+            block = matrix[chunk]
+            chunk_sources, chunk_targets = np.nonzero(block != sentinel)
+            sources += [chunk[chunk_sources].astype(np.int32)]
+            targets += [chunk_targets.astype(np.int32)]
+            values += [self._values(kind, block[chunk_sources, chunk_targets])]
+        if not sources:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64), kind
+        return np.concatenate(sources), np.concatenate(targets), np.concatenate(values), kind
+
+    def row(self, source, distance_type: DistanceType):
+        # decoded distances from one source, without reading any other row
+        import pandas as pd
+        kind = distance_kind(self.timing_codec, distance_type)
+        matrix = self.matrix(distance_type)
+        row = np.asarray(matrix[self.participants.index(source)])
+        targets = np.flatnonzero(row != UNREACHABLE[matrix.dtype])
+        values = self._values(kind, row[targets])
+        return pd.Series(_decode(values, kind), index=pd.Index([self.participants[i] for i in targets], name='target'), name=distance_type.name.lower())
+
+    def frame(self):
+        # same data frame as read_result
+        return _result_frame(self.participants, {distance_type: self.distances(distance_type) for distance_type in DistanceType})
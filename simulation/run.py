@@ -1,66 +1,235 @@
 import argparse
 from pathlib import Path
+import shutil
+import time
 import multiprocessing as mp
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 
-import pandas as pd
-from tqdm import tqdm
-
-from .model import CommunicationNetwork
-from .minimal_paths import single_source_dijkstra_hyperedges, single_source_dijkstra_vertices, DistanceType
+from .model import CommunicationNetwork, EntityNotFound, file_hash, read_json, write_json
+from .minimal_paths import single_source_dijkstra_hyperedges, single_source_dijkstra_vertices, reachable_counts, expand_classes, DistanceType
+from .parallel import SharedHypergraph, schedule
+from .results import ResultWriter, ResultMatrices, read_result, write_result_meta, check_result_meta, appended_paths, appended_path, shard_directory, write_manifest, MANIFEST
+from .incremental import append_channels, update_distances
+from .approximate import approximate
+from .summary import BINS, DistanceSummary, summary_edges, write_summaries
+from .metrics import Metrics
 
 AVAILABLE_DATA_SETS = ('microsoft', )  # other data sets have not been published yet
 
 
+def parse_shard(shard):
+    # 'i/N' with 0 <= i < N
+    try:
+        index, count = map(int, shard.split('/'))
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(f'{shard} is not of the form i/N') from error
+    if not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f'shard {shard} is not one of 0/{count} .. {count - 1}/{count}')
+    return index, count
+
+
+def read_targets(path, participants):
+    # one participant per line, matched by its string form since participant ids need not be strings
+    by_name = {str(participant): participant for participant in participants}
+    names = [line.strip() for line in Path(path).read_text(encoding='utf-8').splitlines() if line.strip()]
+    unknown = [name for name in names if name not in by_name]
+    if unknown:
+        raise EntityNotFound(f'Unknown target participants {", ".join(unknown)} in {path}')
+    return frozenset(by_name[name] for name in names)
+
+
+def result_paths(args, result_dir_path, name):
+    result_name = name if args.targets is None else f'{name}.targets'
+    return result_name, result_dir_path/f'{result_name}.parts' if args.shard is None else shard_directory(result_dir_path, name, *args.shard)
+
+
+def finished(args, result_dir_path, name):
+    # networks skipped by --resume
+    result_name, parts_path = result_paths(args, result_dir_path, name)
+    if args.resume and args.shard and (parts_path/MANIFEST).exists():
+        return True
+    return (args.resume and not args.reachability and not args.approximate and not args.summary and not args.append and not args.dense and not args.shard
+            and not parts_path.exists() and (result_dir_path/f'{result_name}.csv.bz2').exists())
+
+
+def load_network(name, append=None, collapse=False):
+    # runs in the background while the previous network is computing; the network file is extended by the channels
+    # appended to its results so far, and then by those of append
+    start = time.perf_counter()
+    network_path = f'./data/networks/{name}.json.bz2'
+    communication_network = CommunicationNetwork.from_json_cached(network_path, f'./data/networks/{name}.network', name=name)
+    for path in appended_paths('./data/minimal_paths/', name, network_path):
+        communication_network = append_channels(communication_network, CommunicationNetwork.from_json(path))
+    new_channels = None
+    if append:
+        new_channels = CommunicationNetwork.from_json(append)
+        communication_network = append_channels(communication_network, new_channels)
+    search_network, classes = communication_network.collapse() if collapse else (communication_network, None)
+    return communication_network, new_channels, search_network, classes, time.perf_counter() - start
+
+
+def export_result(name, parts_path, participants, result_dir_path, result_name, metrics: Metrics, append=None):
+    # runs in the background while the next network is computing. With append, a copy of the appended channels is kept
+    # beside the results and listed in their meta, so the next load_network starts from the network of these results
+    network_path = f'./data/networks/{name}.json.bz2'
+    appended = appended_paths(result_dir_path, name, network_path)
+    with metrics.phase('write'):
+        if append:
+            appended += [appended_path(result_dir_path, name, len(appended))]
+            appended[-1].parent.mkdir(exist_ok=True)
+            write_json(appended[-1], read_json(append))
+        result = read_result(parts_path, participants)
+        result.info(verbose=True, memory_usage=True, show_counts=True)
+        result.to_csv(result_dir_path/f'{result_name}.csv.bz2', compression='bz2')
+        result.to_pickle(result_dir_path/f'{result_name}.pickle.bz2', compression='bz2')
+        write_result_meta(result_dir_path, result_name, file_hash(network_path), appended)
+        shutil.rmtree(parts_path)
+    metrics.close_network(name)
+    metrics.close()
+
+
 def run_simulation():
     parser = argparse.ArgumentParser(description='Simulating information diffusion in code review communication networks')
     parser.add_argument('--select', type=str, nargs='+', choices=AVAILABLE_DATA_SETS, help='Load a subset of the available data', default=AVAILABLE_DATA_SETS)
     parser.add_argument('--num_processes', type=int, default=mp.cpu_count(), help='Number of parallel processes (default # of CPUs)')
+    parser.add_argument('--resume', action='store_true', help='Continue an interrupted simulation from its checkpoints and skip networks whose results already exist')
+    parser.add_argument('--collapse', action='store_true', help='Search only once per class of participants with the same channels and expand the results to all class members')
+    parser.add_argument('--append', type=str, metavar='PATH', help='Update the existing results of the selected networks with the later channels in PATH (same format as the networks) instead of recomputing them')
+    parser.add_argument('--approximate', type=float, nargs='?', const=0.01, metavar='PRECISION', help='Only estimate the reachable fraction and distance quantiles from a degree-stratified sample '
+                                                                                                      'of sources until all 95%% confidence intervals are within +-PRECISION (default 0.01)')
+    parser.add_argument('--summary', action='store_true', help='Only keep per-source reach counts, distance histograms, and quantile sketches, reduced in the workers, instead of all distances')
+    parser.add_argument('--bins', type=int, default=BINS, help=f'Number of histogram bins in --summary mode (default {BINS})')
+    parser.add_argument('--dense', action='store_true', help='Keep the distances in dense memory-mapped n x n matrices per distance type (<name>.matrix), written directly by the workers, instead of exporting a csv and pickle')
+    parser.add_argument('--metrics', action='store_true', help='Record search counters and wall time per source and distance type, and the time of each phase, in data/minimal_paths/<name>.metrics.jsonl')
+    parser.add_argument('--shard', type=parse_shard, metavar='i/N', help='Only compute the distances from every N-th participant starting with the i-th (0 <= i < N) into '
+                                                                         'data/minimal_paths/<name>.shards/; once all N shards are done, combine them with python3 -m simulation.merge')
+    parser.add_argument('--targets', type=str, metavar='PATH', help='Only compute the distances to the participants listed in PATH, one per line, into data/minimal_paths/<name>.targets.csv.bz2 '
+                                                                    'and .pickle.bz2; shortest and fastest searches via hyperedges stop once they reached all of them, '
+                                                                    'foremost arrivals and --vertex_dijkstra are computed in full and filtered')
+    parser.add_argument('--reachability', action='store_true', help='Only count the reachable participants per source via bitset propagation instead of computing all distances')
 
     group = parser.add_mutually_exclusive_group()
     group.add_argument('--hyperedge_dijkstra', action='store_false', help='Use single-source Dikstra algorithm via hyperedges; tend to be faster than --vertex_dijkstra (default)')
     group.add_argument('--vertex_dijkstra', action='store_true', help='Use single-source Dikstra algorithm via vertices')
 
     args = parser.parse_args()
+    from tqdm import tqdm  # not needed for --help
+    if args.dense and (args.collapse or args.append):
+        parser.error('--dense cannot be combined with --collapse or --append')
+    if args.shard and (args.dense or args.append or args.reachability or args.approximate or args.summary):
+        parser.error('--shard only applies to full runs, optionally with --collapse')
+    if args.targets and (args.dense or args.append or args.reachability or args.approximate or args.summary or args.collapse or args.shard):
+        parser.error('--targets only applies to full runs')
 
     result_dir_path = Path('./data/minimal_paths/')
     result_dir_path.mkdir(parents=True, exist_ok=True)
 
     if args.hyperedge_dijkstra:
-        single_source_dijkstra = single_source_dijkstra_hyperedges
+        single_source_dijkstra, engine = single_source_dijkstra_hyperedges, 'hyperedges'
     else:
-        single_source_dijkstra = single_source_dijkstra_vertices
-
-    for name in args.select:
-        communication_network = CommunicationNetwork.from_json(f'./data/networks/{name}.json.bz2', name=name)
-
-        participants = tuple(sorted(communication_network.participants()))
-        category = pd.api.types.CategoricalDtype(categories=participants, ordered=False)
-        data_frames = []
-        for distance_type in DistanceType:
-            distance_type_name = distance_type.name.lower()
-            min_distances = []
-            with ProcessPoolExecutor(mp_context=mp.get_context('spawn'), max_workers=9) as executor:
-                futures = {executor.submit(
-                    single_source_dijkstra, communication_network, p, distance_type): p for p in participants}
-                for future in tqdm(as_completed(futures), total=len(futures), desc=f'Find all {distance_type_name} distances at {name.capitalize()}'.ljust(36)):
-                    source = futures[future]
-                    if future.exception():
-                        raise future.exception()
-                    for target, distance in future.result().items():
-                        min_distances += [(source, target, distance)]
-            min_distances_df = pd.DataFrame(
-                min_distances, columns=['source', 'target', 'distance'])
-            min_distances = None
-            min_distances_df.source = min_distances_df.source.astype(
-                category)
-            min_distances_df.target = min_distances_df.target.astype(
-                category)
-            data_frames += [min_distances_df.set_index(['source', 'target']).distance.rename(distance_type_name).sort_index()]
-        result = pd.concat(data_frames, axis=1).sort_index()
-        result.info(verbose=True, memory_usage=True, show_counts=True)
-        result.to_csv(result_dir_path/f'{name}.csv.bz2', compression='bz2')
-        result.to_pickle(result_dir_path/f'{name}.pickle.bz2', compression='bz2')
+        single_source_dijkstra, engine = single_source_dijkstra_vertices, 'vertices'
+
+    names = [name for name in args.select if not finished(args, result_dir_path, name)]
+    collapse = args.collapse and not (args.reachability or args.approximate or args.summary or args.dense)
+    # pipelined: the next network is loaded and the results of the previous one are exported while the workers compute
+    with ProcessPoolExecutor(mp_context=mp.get_context('spawn'), max_workers=args.num_processes) as executor, ThreadPoolExecutor(max_workers=1) as loader, ThreadPoolExecutor(max_workers=1) as exporter:
+        loading = loader.submit(load_network, names[0], args.append, collapse) if names else None
+        exports = []
+        for i, name in enumerate(names):
+            result_name, parts_path = result_paths(args, result_dir_path, name)
+            communication_network, new_channels, search_network, classes, load_seconds = loading.result()
+            if i + 1 < len(names):
+                loading = loader.submit(load_network, names[i + 1], args.append, collapse)
+
+            participants = tuple(sorted(communication_network.participants()))
+            targets = None if args.targets is None else read_targets(args.targets, participants)
+            if args.reachability:
+                import pandas as pd
+                reachable = pd.Series(reachable_counts(communication_network, participants), name='reachable').rename_axis('source')
+                reachable.to_csv(result_dir_path/f'{name}.reachability.csv')
+                continue
+
+            if args.approximate:
+                with SharedHypergraph(communication_network) as shared_network:
+                    estimates = approximate(executor, shared_network, communication_network, participants, single_source_dijkstra, args.num_processes, args.approximate)
+                print(estimates.to_string(index=False))
+                estimates.to_csv(result_dir_path/f'{name}.approximate.csv', index=False)
+                continue
+
+            if args.summary:
+                summaries = {}
+                with SharedHypergraph(communication_network) as shared_network:
+                    for distance_type in DistanceType:
+                        edges = summary_edges(communication_network, distance_type, args.bins)
+                        summaries[distance_type] = DistanceSummary(edges)
+                        futures = schedule(executor, shared_network, communication_network, participants, distance_type, single_source_dijkstra, args.num_processes, summary_edges=edges)
+                        with tqdm(total=len(participants), desc=f'Summarize {distance_type.name.lower()} distances at {name.capitalize()}'.ljust(36)) as progress:
+                            for future in as_completed(futures):
+                                summaries[distance_type].merge(future.result())
+                                progress.update(len(futures[future]))
+                write_summaries(result_dir_path, name, summaries)
+                continue
+
+            if args.dense:
+                matrices = ResultMatrices.create(result_dir_path/f'{name}.matrix', communication_network, participants, resume=args.resume)
+                with SharedHypergraph(communication_network) as shared_network:
+                    for distance_type in DistanceType:
+                        completed = matrices.completed(distance_type)
+                        sources = tuple(p for p in participants if p not in completed)
+                        futures = schedule(executor, shared_network, communication_network, sources, distance_type, single_source_dijkstra, args.num_processes, matrix_directory=matrices.directory)
+                        with tqdm(total=len(participants), initial=len(completed), desc=f'Find all {distance_type.name.lower()} distances at {name.capitalize()}'.ljust(36)) as progress:
+                            for future in as_completed(futures):
+                                matrices.complete(distance_type, future.result())
+                                progress.update(len(futures[future]))
+                continue
+
+            metrics_name = result_name if args.shard is None else f'{name}.shard-{args.shard[0]}-of-{args.shard[1]}'
+            metrics = Metrics(result_dir_path/f'{metrics_name}.metrics.jsonl' if args.metrics else None, append=args.resume)
+            metrics.add('load', load_seconds)
+            owned = participants if args.shard is None else participants[args.shard[0]::args.shard[1]]
+            if args.shard is not None and classes is not None:
+                # a class belongs to the shard of its representative
+                owned = tuple(member for representative in owned if representative in classes for member in classes[representative])
+            if args.append:
+                check_result_meta(result_dir_path, name, f'./data/networks/{name}.json.bz2')
+            writer = ResultWriter(parts_path, participants, resume=args.resume)
+            if args.append and not any(writer.completed(distance_type) for distance_type in DistanceType):
+                import pandas as pd
+                previous = pd.read_pickle(result_dir_path/f'{name}.pickle.bz2')
+                update_distances(writer, previous, communication_network, new_channels.channels(), participants)
+                writer.close()
+            with SharedHypergraph(search_network) as shared_network:
+                for distance_type in DistanceType:
+                    distance_type_name = distance_type.name.lower()
+                    completed = writer.completed(distance_type)
+                    sources = tuple(p for p in owned if p not in completed and (classes is None or p in classes))
+                    with metrics.phase('dispatch', distance_type):
+                        futures = schedule(executor, shared_network, search_network, sources, distance_type, single_source_dijkstra, args.num_processes, instrument=metrics.enabled, targets=targets)
+                    with tqdm(total=len(owned), initial=len(completed), desc=f'Find all {distance_type_name} distances at {name.capitalize()}'.ljust(36)) as progress:
+                        for future in as_completed(futures):
+                            if future.exception():
+                                raise future.exception()
+                            with metrics.phase('merge', distance_type):
+                                results = future.result()
+                                if metrics.enabled:
+                                    results, records, seconds = results
+                                    metrics.sources(name, distance_type, engine, records)
+                                    metrics.add('compute', seconds, distance_type)
+                                if classes is not None:
+                                    results = expand_classes(search_network, classes, distance_type, results)
+                            with metrics.phase('write', distance_type):
+                                writer.write(distance_type, results)
+                            progress.update(len(results))
+                    with metrics.phase('write', distance_type):
+                        writer.close()
+            if args.shard is not None:
+                write_manifest(parts_path, name, *args.shard, participants, f'./data/networks/{name}.json.bz2', writer)
+                metrics.close_network(name)
+                metrics.close()
+                continue
+            exports += [exporter.submit(export_result, name, parts_path, participants, result_dir_path, result_name, metrics, args.append)]
+        for export in exports:
+            export.result()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,180 @@
+import argparse
+import asyncio
+import json
+import socket
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from pathlib import Path
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+from .model import CommunicationNetwork, EntityNotFound
+from .minimal_paths import single_source_dijkstra_hyperedges, single_source_dijkstra_vertices, DistanceType
+from .parallel import SharedHypergraph, single_source_task
+from .run import AVAILABLE_DATA_SETS
+
+HOST = '127.0.0.1'
+PORT = 8765
+CACHE_SIZE = 1024  # per-source distance maps kept across all networks
+
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    return value
+
+
+class QueryServer:
+    # keeps networks in memory and answers queries from per-source distance maps; the maps are kept in an LRU cache,
+    # and concurrent queries for a map that is still being computed wait for the same search. Searches run in
+    # threads or, with a process pool, in its workers on the networks published to shared memory
+    def __init__(self, networks: dict, executor=None, cache_size=CACHE_SIZE, single_source_dijkstra=single_source_dijkstra_hyperedges):
+        self._networks = networks
+        self._executor = executor
+        self._single_source_dijkstra = single_source_dijkstra
+        self._shared = {name: SharedHypergraph(network) for name, network in networks.items()} if isinstance(executor, ProcessPoolExecutor) else {}
+        self._cache_size = cache_size
+        self._cache: OrderedDict = OrderedDict()
+        self._pending: dict = {}
+        self.stats = {'hits': 0, 'misses': 0, 'coalesced': 0}
+
+    def _network(self, name):
+        if name is None and len(self._networks) == 1:
+            return next(iter(self._networks.items()))
+        if name not in self._networks:
+            raise KeyError(f'unknown network {name}')
+        return name, self._networks[name]
+
+    async def _search(self, name, network, source, distance_type: DistanceType):
+        loop = asyncio.get_running_loop()
+        if name in self._shared:
+            results = await loop.run_in_executor(self._executor, single_source_task, self._shared[name].handle, self._single_source_dijkstra, (source,), distance_type)
+            return results[source]
+        return await loop.run_in_executor(self._executor, self._single_source_dijkstra, network, source, distance_type)
+
+    async def distances(self, name, source, distance_type: DistanceType):
+        name, network = self._network(name)
+        network.vertex_index(source)  # unknown participants fail before anything is cached
+        key = (name, source, distance_type)
+        if key in self._cache:
+            self.stats['hits'] += 1
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        if key in self._pending:
+            self.stats['coalesced'] += 1
+            return await asyncio.shield(self._pending[key])
+        self.stats['misses'] += 1
+        self._pending[key] = asyncio.ensure_future(self._search(name, network, source, distance_type))
+        try:
+            distances = await asyncio.shield(self._pending[key])
+        finally:
+            del self._pending[key]
+        self._cache[key] = distances
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return distances
+
+    def _timing(self, name, value):
+        # timings in queries are iso strings on networks with datetime timings
+        _, network = self._network(name)
+        return datetime.fromisoformat(value) if network.timing_codec().timing_type is datetime else value
+
+    async def answer(self, request: dict):
+        name = request.get('network')
+        match request.get('query'):
+            case 'distances':
+                distances = await self.distances(name, request['source'], DistanceType[request.get('distance_type', 'shortest').upper()])
+                return {'distances': [[target, _json_value(distance)] for target, distance in distances.items()]}
+            case 'distance':
+                self._network(name)[1].vertex_index(request['target'])
+                distances = await self.distances(name, request['source'], DistanceType[request.get('distance_type', 'shortest').upper()])
+                return {'distance': _json_value(distances.get(request['target']))}
+            case 'reachable':
+                # participants the source can reach, with 'by' only those reached no later than it
+                arrivals = await self.distances(name, request['source'], DistanceType.FOREMOST)
+                by = self._timing(name, request['by']) if request.get('by') is not None else None
+                return {'reachable': [target for target, arrival in arrivals.items() if by is None or arrival <= by]}
+            case 'networks':
+                return {'networks': list(self._networks)}
+            case 'stats':
+                return {**self.stats, 'cached': len(self._cache), 'pending': len(self._pending)}
+            case unknown:
+                raise ValueError(f'unknown query {unknown}')
+
+    async def _serve_client(self, reader, writer):
+        # one json request per line, answered in order with one json response per line
+        try:
+            while line := await reader.readline():
+                try:
+                    response = await self.answer(json.loads(line))
+                except (KeyError, ValueError, TypeError, EntityNotFound) as error:
+                    response = {'error': f'{type(error).__name__}: {error}'}
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host=HOST, port=PORT, path=None):
+        if path is not None:
+            return await asyncio.start_unix_server(self._serve_client, path=path)
+        return await asyncio.start_server(self._serve_client, host, port)
+
+    def close(self):
+        for shared_network in self._shared.values():
+            shared_network.close()
+        self._shared = {}
+
+
+def query(request: dict, host=HOST, port=PORT, path=None):
+    # blocking single-request client
+    with (socket.socket(socket.AF_UNIX) if path is not None else socket.socket()) as client:
+        client.connect(path if path is not None else (host, port))
+        client.sendall(json.dumps(request).encode() + b'\n')
+        response = b''
+        while not response.endswith(b'\n'):
+            chunk = client.recv(1 << 16)
+            if not chunk:
+                break
+            response += chunk
+    return json.loads(response)
+
+
+async def serve(networks, host=HOST, port=PORT, path=None, cache_size=CACHE_SIZE, num_processes=0, single_source_dijkstra=single_source_dijkstra_hyperedges):
+    executor = ProcessPoolExecutor(mp_context=mp.get_context('spawn'), max_workers=num_processes) if num_processes else None
+    server = QueryServer(networks, executor, cache_size, single_source_dijkstra)
+    try:
+        async with await server.start(host, port, path) as listener:
+            print(f'Serving {", ".join(networks)} on {path or f"{host}:{port}"}', flush=True)
+            await listener.serve_forever()
+    finally:
+        server.close()
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Answer distance and reachability queries on code review communication networks kept in memory')
+    parser.add_argument('--select', type=str, nargs='*', choices=AVAILABLE_DATA_SETS, help='Serve a subset of the available data', default=AVAILABLE_DATA_SETS)
+    parser.add_argument('--networks', type=str, nargs='+', default=(), help='Also serve these network files, named by their file name without suffixes')
+    parser.add_argument('--host', type=str, default=HOST, help=f'Address to listen on (default {HOST}, local only)')
+    parser.add_argument('--port', type=int, default=PORT, help=f'Port to listen on (default {PORT})')
+    parser.add_argument('--socket', type=str, help='Listen on this unix domain socket instead')
+    parser.add_argument('--cache_size', type=int, default=CACHE_SIZE, help=f'Number of per-source distance maps to cache (default {CACHE_SIZE})')
+    parser.add_argument('--num_processes', type=int, default=0, help='Search in this many worker processes instead of threads of the server (default 0)')
+    parser.add_argument('--vertex_dijkstra', action='store_true', help='Use single-source Dikstra algorithm via vertices')
+    args = parser.parse_args()
+
+    networks = {name: CommunicationNetwork.from_json_cached(f'./data/networks/{name}.json.bz2', f'./data/networks/{name}.network', name=name) for name in args.select}
+    for path in args.networks:
+        name = Path(path).name.split('.')[0]
+        networks[name] = CommunicationNetwork.from_json(path, name=name)
+    single_source_dijkstra = single_source_dijkstra_vertices if args.vertex_dijkstra else single_source_dijkstra_hyperedges
+    asyncio.run(serve(networks, args.host, args.port, args.socket, args.cache_size, args.num_processes, single_source_dijkstra))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+from pathlib import Path
+
+import numpy as np
+
+from .model import MICROSECOND
+from .minimal_paths import DistanceType
+from .results import _kind, _encoder, _decode, float_bits
+
+BINS = 64
+SKETCH_SIZE = 256
+QUANTILES = (0.01, 0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99)
+
+
+class QuantileSketch:
+    # KLL-style mergeable quantile sketch: level h holds items of weight 2**h; an overfull level is sorted and every
+    # other item, starting at a random offset, is promoted to the next level. Lower levels get smaller capacities
+    def __init__(self, k=SKETCH_SIZE, seed=None):
+        self.k = k
+        self.levels = [np.empty(0, dtype=np.int64)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        return max(2, int(np.ceil(self.k * (2 / 3) ** (len(self.levels) - 1 - level))))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels += [np.empty(0, dtype=np.int64)]
+                items = np.sort(items)
+                kept, items = items[len(items) - len(items) % 2:], items[:len(items) - len(items) % 2]
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], items[self._rng.integers(2)::2]])
+                self.levels[level] = kept
+            level += 1
+
+    def update(self, values):
+        self.levels[0] = np.concatenate([self.levels[0], np.asarray(values, dtype=np.int64)])
+        self._compress()
+
+    def merge(self, other):
+        for level, items in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels += [np.empty(0, dtype=np.int64)]
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self._compress()
+
+    def quantiles(self, quantiles):
+        values = np.concatenate(self.levels)
+        if not len(values):
+            return [None] * len(quantiles)
+        weights = np.concatenate([np.full(len(items), 1 << level, dtype=np.int64) for level, items in enumerate(self.levels)])
+        order = np.argsort(values, kind='stable')
+        cumulative = np.cumsum(weights[order])
+        positions = np.searchsorted(cumulative, np.asarray(quantiles) * cumulative[-1])
+        return values[order][np.minimum(positions, len(values) - 1)].tolist()
+
+
+class DistanceSummary:
+    # fixed-size reduction of the distances of one distance type: reached targets per source, a histogram, and a
+    # quantile sketch; distances are encoded as in the result shards. Bin 0 counts distances below edges[0],
+    # bin i those in [edges[i - 1], edges[i]), and the last one those from edges[-1] on
+    def __init__(self, edges, k=SKETCH_SIZE, seed=None):
+        self.edges = np.asarray(edges, dtype=np.int64)
+        self.counts = np.zeros(len(self.edges) + 1, dtype=np.int64)
+        self.reachable: dict = {}
+        self.sketch = QuantileSketch(k, seed)
+        self.kind = None
+
+    def add(self, source, distances: dict):
+        self.reachable[source] = len(distances)
+        if not distances:
+            return
+        if self.kind is None:
+            self.kind = _kind(next(iter(distances.values())))
+        values = np.fromiter(map(_encoder(self.kind), distances.values()), dtype=np.int64, count=len(distances))
+        self.counts += np.bincount(np.searchsorted(self.edges, values, side='right'), minlength=len(self.counts))
+        self.sketch.update(values)
+
+    def merge(self, other):
+        self.counts += other.counts
+        self.reachable.update(other.reachable)
+        self.sketch.merge(other.sketch)
+        self.kind = self.kind or other.kind
+        return self
+
+    def histogram(self):
+        import pandas as pd
+        kind = self.kind or 'int'
+        bounds = pd.array(_decode(self.edges, kind), dtype='Int64' if kind == 'int' else None)
+        return pd.DataFrame({'lower': pd.array([None, *bounds], dtype=bounds.dtype), 'upper': pd.array([*bounds, None], dtype=bounds.dtype), 'count': self.counts})
+
+    def quantiles(self, quantiles=QUANTILES):
+        import pandas as pd
+        values = self.sketch.quantiles(quantiles)
+        if values[0] is None:
+            return pd.DataFrame({'quantile': quantiles, 'value': values})
+        return pd.DataFrame({'quantile': quantiles, 'value': _decode(np.array(values, dtype=np.int64), self.kind or 'int')})
+
+
+def summary_edges(hypergraph, distance_type: DistanceType, bins=BINS):
+    # unit bins for hop counts; equal-width bins over the time span of the network for the temporal distances
+    codec = hypergraph.timing_codec()
+    timings = hypergraph.timing_array()
+    first, last = (int(timings.min()), int(timings.max())) if len(timings) else (0, 0)
+    if codec.timing_type is float:
+        # placed on the decoded timings, then encoded like float distances
+        unit, encode = float(codec.resolution), float_bits
+        first, last = codec.decode(first), codec.decode(last)
+    else:
+        scale = 1 if codec.timing_type is int else codec.resolution // MICROSECOND
+        unit, encode = 1, lambda edges: edges.astype(np.int64)
+        first, last = first * scale, last * scale
+    match distance_type:
+        case DistanceType.SHORTEST:
+            return np.arange(1, bins + 2)
+        case DistanceType.FASTEST:
+            return np.unique(encode(np.linspace(0, last - first + unit, bins + 1)))
+        case DistanceType.FOREMOST:
+            return np.unique(encode(np.linspace(first, last + unit, bins + 1)))
+
+
+def write_summaries(directory, name, summaries: dict, quantiles=QUANTILES):
+    import pandas as pd
+    directory = Path(directory)
+    reachable = summaries[DistanceType.SHORTEST].reachable
+    pd.Series(reachable, name='reachable').rename_axis('source').sort_index().to_csv(directory/f'{name}.reachability.csv')
+    pd.concat({distance_type.name.lower(): summary.histogram() for distance_type, summary in summaries.items()}, names=['distance_type', 'bin']).to_csv(directory/f'{name}.histograms.csv')
+    pd.concat({distance_type.name.lower(): summary.quantiles(quantiles) for distance_type, summary in summaries.items()}, names=['distance_type', None]).droplevel(1).to_csv(directory/f'{name}.quantiles.csv')
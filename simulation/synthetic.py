@@ -0,0 +1,72 @@
+import argparse
+import bz2
+import json
+from pathlib import Path
+
+import numpy as np
+
+ORIGIN = np.datetime64('2020-01-06T00:00:00', 's')  # a Monday
+ACTIVITY_SHAPE = 2.0  # Pareto shape of the participation rates; smaller is more skewed
+MEAN_CHANNEL_SIZE = 3.5
+MAX_CHANNEL_SIZE = 64
+WEEKEND_WEIGHT = 0.15  # relative chance of a review to start on a Saturday or Sunday
+MEDIAN_DURATION = 20 * 3600  # seconds from the start of a review to its last comment
+DURATION_SIGMA = 1.2
+CHANNELS_PER_PARTICIPANT = 8
+CHANNELS_PER_DAY = 10000
+
+
+def generate_channels(num_channels, num_participants=None, days=None, seed=None):
+    # synthetic code reviews: heavy-tailed participation, mostly small channels with a long tail,
+    # starts during working hours on mostly weekdays, and log-normal review durations
+    rng = np.random.default_rng(seed)
+    num_participants = num_participants or max(2, num_channels // CHANNELS_PER_PARTICIPANT)
+    days = days or max(7, -(-num_channels // CHANNELS_PER_DAY))
+
+    activity = rng.pareto(ACTIVITY_SHAPE, num_participants) + 1
+    activity /= activity.sum()
+    sizes = np.minimum(1 + rng.geometric(1 / (MEAN_CHANNEL_SIZE - 1), num_channels), min(MAX_CHANNEL_SIZE, num_participants))
+    members = np.split(rng.choice(num_participants, sizes.sum(), p=activity), np.cumsum(sizes)[:-1])
+
+    weekdays = (np.arange(days) + ORIGIN.astype('datetime64[D]').view(np.int64) + 3) % 7  # 0 is Monday, 1970-01-01 was a Thursday
+    day_weights = np.where(weekdays < 5, 1.0, WEEKEND_WEIGHT)
+    day = rng.choice(days, num_channels, p=day_weights / day_weights.sum())
+    time_of_day = np.clip(rng.normal(13.5 * 3600, 3 * 3600, num_channels), 0, 86399).astype(np.int64)
+    starts = ORIGIN + (day * 86400 + time_of_day).astype('timedelta64[s]')
+    durations = np.maximum(60, rng.lognormal(np.log(MEDIAN_DURATION), DURATION_SIGMA, num_channels)).astype(np.int64)
+    ends = starts + durations.astype('timedelta64[s]')
+
+    for i, (participants, start, end) in enumerate(zip(members, np.datetime_as_string(starts), np.datetime_as_string(ends))):
+        # drawn with replacement, so frequent participants may collapse into one
+        yield str(i), {'bound': 'bounded', 'end': str(end), 'participants': np.unique(participants).tolist(), 'start': str(start)}
+
+
+def write_network(file_path, channels):
+    # streams the channels into the json format of CommunicationNetwork.from_json, bz2-compressed for a .bz2 suffix
+    file_path = Path(file_path)
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    with (bz2.open(file_path, 'wt', encoding='utf-8') if file_path.suffix == '.bz2' else file_path.open('w', encoding='utf-8')) as file:
+        file.write('{')
+        for i, (chan_id, channel) in enumerate(channels):
+            file.write(f'{"," if i else ""}\n{json.dumps(chan_id)}: {json.dumps(channel)}')
+        file.write('\n}\n')
+    return file_path
+
+
+def generate_network(file_path, num_channels, num_participants=None, days=None, seed=None):
+    return write_network(file_path, generate_channels(num_channels, num_participants, days, seed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic code review communication network')
+    parser.add_argument('path', type=str, help='Output file (.json or .json.bz2)')
+    parser.add_argument('--channels', type=int, default=1000, help='Number of channels (default 1000)')
+    parser.add_argument('--participants', type=int, help=f'Number of participants (default channels / {CHANNELS_PER_PARTICIPANT})')
+    parser.add_argument('--days', type=int, help=f'Time span in days (default channels / {CHANNELS_PER_DAY}, at least a week)')
+    parser.add_argument('--seed', type=int, help='Seed of the random generator')
+    args = parser.parse_args()
+    generate_network(args.path, args.channels, args.participants, args.days, args.seed)
+
+
+if __name__ == '__main__':
+    main()
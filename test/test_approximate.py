@@ -0,0 +1,39 @@
+import unittest
+
+import numpy as np
+
+from simulation.model import CommunicationNetwork
+from simulation.minimal_paths import single_source_dijkstra_hyperedges, DistanceType
+from simulation.approximate import degree_strata, StratifiedSample, StratifiedEstimator
+
+
+class Sampling(unittest.TestCase):
+    communication_network = CommunicationNetwork.from_json('./data/networks/SimpleTestData.json')
+    participants = tuple(sorted(communication_network.participants()))
+
+    def test_strata(self):
+        strata = degree_strata(Sampling.communication_network, Sampling.participants)
+        self.assertEqual(sorted(participant for stratum in strata for participant in stratum), list(Sampling.participants))
+        degrees = [[len(Sampling.communication_network.channels(participant)) for participant in stratum] for stratum in strata]
+        for lower, upper in zip(degrees, degrees[1:]):
+            self.assertLess(max(lower), min(upper))
+
+    def test_sample(self):
+        strata = degree_strata(Sampling.communication_network, Sampling.participants)
+        sample = StratifiedSample(strata, seed=1)
+        batch = sample.draw(2 * len(strata))
+        self.assertEqual(len(set(batch)), len(batch))
+        self.assertTrue(all(drawn == min(2, len(stratum)) for drawn, stratum in zip(sample.drawn, strata)))
+        self.assertEqual(len(batch + sample.draw(100)), len(Sampling.participants))
+        self.assertEqual(sample.draw(1), [])
+
+    def test_full_sample_is_exact(self):
+        strata = degree_strata(Sampling.communication_network, Sampling.participants)
+        estimator = StratifiedEstimator(strata)
+        for distance_type in DistanceType:
+            estimator.add(distance_type, {source: single_source_dijkstra_hyperedges(Sampling.communication_network, source, distance_type) for source in Sampling.participants})
+        report = estimator.report(quantiles=(0.5,))
+        shortest = [distance for source in Sampling.participants for distance in single_source_dijkstra_hyperedges(Sampling.communication_network, source, DistanceType.SHORTEST).values()]
+        self.assertAlmostEqual(report.estimate[0], len(shortest) / (len(Sampling.participants) * (len(Sampling.participants) - 1)))
+        self.assertEqual(report.estimate[1], np.sort(shortest)[(len(shortest) - 1) // 2])
+        self.assertTrue((report.half_width == 0).all())
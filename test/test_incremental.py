@@ -0,0 +1,95 @@
+import unittest
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from simulation.model import CommunicationNetwork, write_json, file_hash
+from simulation.minimal_paths import single_source_dijkstra_hyperedges, DistanceType
+from simulation.results import ResultWriter, read_result, write_result_meta, check_result_meta, appended_paths, appended_path
+from simulation.incremental import append_channels, update_distances
+
+
+def full_result(communication_network, directory):
+    participants = tuple(sorted(communication_network.participants()))
+    writer = ResultWriter(directory, participants)
+    for distance_type in DistanceType:
+        writer.write(distance_type, {source: single_source_dijkstra_hyperedges(communication_network, source, distance_type) for source in participants})
+    writer.close()
+    return read_result(directory, participants)
+
+
+class IncrementalUpdate(unittest.TestCase):
+
+    def assert_update_equals_recomputation(self, channels, timings, appended_channels, new_timings):
+        communication_network = CommunicationNetwork(channels, timings)
+        new_channels = CommunicationNetwork(appended_channels, new_timings)
+        extended_network = append_channels(communication_network, new_channels)
+        participants = tuple(sorted(extended_network.participants()))
+        with tempfile.TemporaryDirectory() as directory:
+            previous = full_result(communication_network, Path(directory)/'previous')
+            writer = ResultWriter(Path(directory)/'parts', participants)
+            affected = update_distances(writer, previous, extended_network, new_channels.channels(), participants)
+            writer.close()
+            completed = writer.completed(DistanceType.FASTEST)
+            self.assertEqual(len(completed), len(participants) - len(affected))
+            writer.write(DistanceType.FASTEST, {source: single_source_dijkstra_hyperedges(extended_network, source, DistanceType.FASTEST)
+                                                for source in participants if source not in completed})
+            writer.close()
+            result = read_result(Path(directory)/'parts', participants)
+            expected = full_result(CommunicationNetwork({**channels, **appended_channels}, {**timings, **new_timings}), Path(directory)/'expected')
+        pd.testing.assert_frame_equal(result, expected)
+
+    def test_simple_data(self):
+        communication_network = CommunicationNetwork.from_json('./data/networks/SimpleTestData.json')
+        timings = communication_network.timings()
+        latest = sorted(timings.values())[-3]
+        channels = {channel: list(communication_network.participants(channel)) for channel in timings}
+        self.assert_update_equals_recomputation({channel: channels[channel] for channel in timings if timings[channel] < latest},
+                                                {channel: timing for channel, timing in timings.items() if timing < latest},
+                                                {channel: channels[channel] for channel in timings if timings[channel] >= latest},
+                                                {channel: timing for channel, timing in timings.items() if timing >= latest})
+
+    def test_new_participants_and_shortcuts(self):
+        self.assert_update_equals_recomputation({'h1': ['v1', 'v2'], 'h2': ['v2', 'v3'], 'h3': ['v3', 'v4'], 'h4': ['v5', 'v6']},
+                                                {'h1': 1, 'h2': 2, 'h3': 3, 'h4': 3},
+                                                {'h5': ['v1', 'v4'], 'h6': ['v4', 'v7'], 'h7': ['v7', 'v2'], 'h8': ['v6', 'v8']},
+                                                {'h5': 4, 'h6': 5, 'h7': 5, 'h8': 6})
+
+    def test_unreachable_previous_result(self):
+        # an empty previous result has int columns only
+        self.assert_update_equals_recomputation({'h1': ['v1'], 'h2': ['v2']}, {'h1': datetime(2020, 1, 1), 'h2': datetime(2020, 1, 2)},
+                                                {'h3': ['v1', 'v2'], 'h4': ['v2', 'v3']}, {'h3': datetime(2020, 1, 3), 'h4': datetime(2020, 1, 4)})
+
+    def test_float_timings(self):
+        self.assert_update_equals_recomputation({'h1': ['v1', 'v2'], 'h2': ['v2', 'v3']}, {'h1': -0.5, 'h2': 1.25},
+                                                {'h3': ['v3', 'v4'], 'h4': ['v1', 'v4']}, {'h3': 1.5, 'h4': 2.1})
+
+    def test_earlier_channels(self):
+        communication_network = CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v2', 'v3']}, {'h1': 1, 'h2': 2})
+        with self.assertRaises(ValueError):
+            append_channels(communication_network, CommunicationNetwork({'h3': ['v1', 'v3']}, {'h3': 2}))
+        with self.assertRaises(ValueError):
+            append_channels(communication_network, CommunicationNetwork({'h2': ['v1', 'v3']}, {'h2': 3}))
+
+    def test_result_meta(self):
+        with tempfile.TemporaryDirectory() as directory:
+            network_path = Path(directory)/'network.json'
+            network_path.write_text('{}')
+            with self.assertRaises(ValueError):
+                check_result_meta(directory, 'network', network_path)
+            write_result_meta(directory, 'network', file_hash(network_path))
+            check_result_meta(directory, 'network', network_path)
+            self.assertEqual(appended_paths(directory, 'network', network_path), [])
+            appended = [appended_path(directory, 'network', index) for index in range(2)]
+            appended[0].parent.mkdir()
+            for path in appended:
+                write_json(path, {})
+            write_result_meta(directory, 'network', file_hash(network_path), appended)
+            self.assertEqual(appended_paths(directory, 'network', network_path), appended)
+            network_path.write_text('{"h1": {"end": "2023-05-26T12:00:00", "participants": ["v1"]}}')
+            with self.assertRaises(ValueError):
+                check_result_meta(directory, 'network', network_path)
+            # appended channels only extend the network file they were appended to
+            self.assertEqual(appended_paths(directory, 'network', network_path), [])
@@ -1,9 +1,11 @@
 import unittest
 import bz2
+import random
 from unittest import mock
-from datetime import datetime
-from simulation.model import CommunicationNetwork
-from simulation.minimal_paths import single_source_dijkstra_vertices, single_source_dijkstra_hyperedges, DistanceType
+from datetime import datetime, timedelta
+from simulation.model import CommunicationNetwork, EntityNotFound
+from simulation.minimal_paths import single_source_dijkstra_vertices, single_source_dijkstra_hyperedges, all_sources_foremost, reachability_matrix, reachable_counts, expand_classes
+from simulation.minimal_paths import single_source_windows, sliding_windows, single_source_profile, foremost_at, fastest_at, SearchCounters, DistanceType
 
 
 class MinimalPath(unittest.TestCase):
@@ -205,4 +207,207 @@ class BadData(unittest.TestCase):
     #         self.assertEqual(single_source_dijkstra_hyperedges(BadData.cn, 1, DistanceType.FOREMOST, min_timing=0), {12:1})
 
     #     with self.assertRaises(Exception):
-    #         self.assertEqual(single_source_dijkstra_hyperedges(BadData.cn, "a", DistanceType.FOREMOST, min_timing=0), {2: 12})
\ No newline at end of file
+    #         self.assertEqual(single_source_dijkstra_hyperedges(BadData.cn, "a", DistanceType.FOREMOST, min_timing=0), {2: 12})
+
+
+class AllSourcesForemost(unittest.TestCase):
+
+    def assert_equivalent(self, communication_network):
+        result = all_sources_foremost(communication_network)
+        self.assertEqual(set(result), set(communication_network.participants()))
+        for source, vertex_distances in result.items():
+            self.assertEqual(vertex_distances, single_source_dijkstra_hyperedges(communication_network, source, DistanceType.FOREMOST))
+
+    def test_equivalent_to_dijkstra(self):
+        self.assert_equivalent(TestingFastestAndForemost.communication_network)
+        self.assert_equivalent(CommunicationNetwork.from_json('./data/networks/SimpleTestData.json'))
+
+    def test_same_timings(self):
+        communication_network = CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v2', 'v3'], 'h3': ['v3', 'v4']}, {'h1': 1, 'h2': 1, 'h3': 2})
+        self.assertEqual(all_sources_foremost(communication_network, ['v1'])['v1'], {'v2': 1})
+        self.assert_equivalent(communication_network)
+
+    def test_subset_of_sources(self):
+        result = all_sources_foremost(TestingFastestAndForemost.communication_network, ['Anton', 'Axel'])
+        self.assertEqual(result, {'Anton': {'Simon': 2, 'Donald': 2}, 'Axel': {"Simon": 1, "Anton": 2, "Donald": 2, "Joakim": 3, "Daniel": 3, "Harald": 3}})
+
+
+class Reachability(unittest.TestCase):
+    communication_network = CommunicationNetwork.from_json('./data/networks/SimpleTestData.json')
+
+    def test_matrix_equivalent_to_dijkstra(self):
+        sources = sorted(Reachability.communication_network.participants())
+        matrix = reachability_matrix(Reachability.communication_network, sources)
+        vertex_ids = Reachability.communication_network.vertex_ids()
+        for source, row in zip(sources, matrix):
+            expected = single_source_dijkstra_hyperedges(Reachability.communication_network, source, DistanceType.SHORTEST, min_timing=0)
+            self.assertEqual({vertex_ids[i] for i in row.nonzero()[0]}, set(expected))
+
+    def test_counts(self):
+        self.assertEqual(reachable_counts(TestingFastestAndForemost.communication_network, ['Axel', 'Anton', 'Joakim']), {'Axel': 6, 'Anton': 2, 'Joakim': 3})
+
+    def test_more_than_one_word(self):
+        hedges = {f'h{i}': [f'v{i}', f'v{i + 1}'] for i in range(100)}
+        communication_network = CommunicationNetwork(hedges, {f'h{i}': i for i in range(100)})
+        counts = reachable_counts(communication_network)
+        self.assertEqual([counts[f'v{i}'] for i in range(101)], [101 - i if i else 100 for i in range(101)])
+
+
+class StructuralEquivalence(unittest.TestCase):
+    communication_network = CommunicationNetwork({'h1': ['v1', 'v2', 'v5'], 'h2': ['v2', 'v3'], 'h3': ['v3', 'v4', 'v6'], 'h4': ['v3', 'v4', 'v6'], 'h5': ['v1', 'v5']},
+                                                 {'h1': datetime(2023, 1, 1), 'h2': datetime(2023, 1, 2), 'h3': datetime(2023, 1, 3), 'h4': datetime(2023, 1, 3), 'h5': datetime(2023, 1, 4)})
+
+    def test_collapse(self):
+        collapsed, classes = StructuralEquivalence.communication_network.collapse()
+        self.assertEqual(classes, {'v1': ('v1', 'v5'), 'v2': ('v2',), 'v3': ('v3',), 'v4': ('v4', 'v6')})
+        self.assertEqual(set(collapsed.participants()), {'v1', 'v2', 'v3', 'v4'})
+        self.assertEqual(set(collapsed.channels()), {'h1', 'h2', 'h3', 'h5'})
+
+    def test_expansion_is_lossless(self):
+        communication_network = StructuralEquivalence.communication_network
+        collapsed, classes = communication_network.collapse()
+        for single_source_dijkstra in (single_source_dijkstra_hyperedges, single_source_dijkstra_vertices):
+            for distance_type in DistanceType:
+                expected = {source: single_source_dijkstra(communication_network, source, distance_type) for source in communication_network.participants()}
+                results = {source: single_source_dijkstra(collapsed, source, distance_type) for source in classes}
+                self.assertEqual(expand_classes(collapsed, classes, distance_type, results), expected)
+
+
+class DominancePruning(unittest.TestCase):
+
+    def random_network(self, seed, num_participants=30, num_channels=90):
+        # few distinct timings, so many labels of a vertex compete
+        rng = random.Random(seed)
+        hedges = {f'c{i}': [f'p{rng.randrange(num_participants)}' for _ in range(rng.choice((1, 2, 2, 3, 4, 6)))] for i in range(num_channels)}
+        return CommunicationNetwork(hedges, {channel: datetime(2020, 1, 1) + timedelta(hours=rng.randrange(num_channels // 3)) for channel in hedges})
+
+    def test_equivalent_to_hyperedges(self):
+        for seed in range(10):
+            communication_network = self.random_network(seed)
+            window = (datetime(2020, 1, 1, 3), datetime(2020, 1, 2, 2))
+            for distance_type in DistanceType:
+                for participant in communication_network.participants():
+                    self.assertEqual(single_source_dijkstra_vertices(communication_network, participant, distance_type), single_source_dijkstra_hyperedges(communication_network, participant, distance_type))
+                    self.assertEqual(single_source_dijkstra_vertices(communication_network, participant, distance_type, window=window), single_source_dijkstra_hyperedges(communication_network, participant, distance_type, window=window))
+
+    def test_pruned_labels(self):
+        communication_network = self.random_network(0)
+        for distance_type in DistanceType:
+            counters = SearchCounters()
+            single_source_dijkstra_vertices(communication_network, 'p0', distance_type, counters=counters)
+            # far fewer labels than (participant, channel) pairs after the first channel of p0
+            self.assertLess(counters.labels, sum(map(len, (communication_network.participants(channel) for channel in communication_network.channels()))) // 2)
+
+    def test_one_foremost_label(self):
+        communication_network = self.random_network(0)
+        counters = SearchCounters()
+        distances = single_source_dijkstra_vertices(communication_network, 'p0', DistanceType.FOREMOST, counters=counters)
+        # one label per reached participant and the source label; labels queued before an earlier one are stale entries
+        self.assertEqual(counters.labels, len(distances) + 1)
+        self.assertEqual(counters.pops - counters.stale, counters.labels)
+        self.assertGreater(counters.stale, 0)
+
+
+class Targets(unittest.TestCase):
+
+    def test_equivalent_to_filtered_distances(self):
+        communication_network = DominancePruning().random_network(1)
+        participants = sorted(communication_network.participants())
+        targets = participants[::4]
+        bounds = {DistanceType.SHORTEST: 2, DistanceType.FASTEST: timedelta(hours=5), DistanceType.FOREMOST: datetime(2020, 1, 1, 12, 30)}
+        for distance_type in DistanceType:
+            for participant in participants:
+                distances = single_source_dijkstra_hyperedges(communication_network, participant, distance_type)
+                within = {target: distance for target, distance in distances.items() if distance <= bounds[distance_type]}
+                for single_source_dijkstra in (single_source_dijkstra_hyperedges, single_source_dijkstra_vertices):
+                    self.assertEqual(single_source_dijkstra(communication_network, participant, distance_type, targets=targets), {target: distance for target, distance in distances.items() if target in targets})
+                    self.assertEqual(single_source_dijkstra(communication_network, participant, distance_type, max_distance=bounds[distance_type]), within)
+                    self.assertEqual(single_source_dijkstra(communication_network, participant, distance_type, targets=targets, max_distance=bounds[distance_type]), {target: distance for target, distance in within.items() if target in targets})
+
+    def test_early_termination(self):
+        communication_network = CommunicationNetwork.from_json('./data/networks/SimpleTestData.json')
+        full, targeted = SearchCounters(), SearchCounters()
+        single_source_dijkstra_hyperedges(communication_network, 1, DistanceType.FASTEST, counters=full)
+        # 2 shares the first channel of 1
+        self.assertEqual(single_source_dijkstra_hyperedges(communication_network, 1, DistanceType.FASTEST, counters=targeted, targets=[2, 1]), {2: timedelta(0)})
+        self.assertEqual(targeted.labels, 1)
+        self.assertLess(targeted.relaxations, full.relaxations)
+        self.assertEqual(single_source_dijkstra_hyperedges(communication_network, 1, DistanceType.SHORTEST, targets=[1]), {})
+
+    def test_unknown_target(self):
+        with self.assertRaises(EntityNotFound):
+            single_source_dijkstra_hyperedges(MinimalPath.communication_network, 'v1', DistanceType.SHORTEST, targets=['v5'])
+
+
+class TimeWindows(unittest.TestCase):
+    communication_network = CommunicationNetwork.from_json('./data/networks/SimpleTestData.json')
+
+    def window_network(self, start, end):
+        timings = {channel: timing for channel, timing in TimeWindows.communication_network.timings().items() if start <= timing <= end}
+        return CommunicationNetwork({channel: TimeWindows.communication_network.participants(channel) for channel in timings}, timings)
+
+    def test_window_equals_window_network(self):
+        window = (datetime(2020, 2, 7), datetime(2020, 2, 20, 12, 30))
+        window_network = self.window_network(*window)
+        for single_source_dijkstra in (single_source_dijkstra_hyperedges, single_source_dijkstra_vertices):
+            for distance_type in DistanceType:
+                for participant in TimeWindows.communication_network.participants():
+                    expected = single_source_dijkstra(window_network, participant, distance_type) if participant in window_network.participants() else {}
+                    self.assertEqual(single_source_dijkstra(TimeWindows.communication_network, participant, distance_type, window=window), expected)
+        sources = sorted(window_network.participants())
+        self.assertEqual(all_sources_foremost(TimeWindows.communication_network, sources, window=window), all_sources_foremost(window_network, sources))
+        self.assertEqual(reachable_counts(TimeWindows.communication_network, sources, window=window), reachable_counts(window_network, sources))
+
+    def test_sliding_windows(self):
+        windows = sliding_windows(datetime(2020, 2, 1), datetime(2020, 3, 1), timedelta(days=10), timedelta(days=3))
+        self.assertEqual(windows[1], (datetime(2020, 2, 4), datetime(2020, 2, 14)))
+        self.assertGreaterEqual(windows[-1][1], datetime(2020, 3, 1))
+        for distance_type in DistanceType:
+            for participant in TimeWindows.communication_network.participants():
+                results = single_source_windows(TimeWindows.communication_network, participant, distance_type, windows)
+                self.assertEqual(list(results), windows)
+                for window in windows:
+                    self.assertEqual(results[window], single_source_dijkstra_hyperedges(TimeWindows.communication_network, participant, distance_type, window=window))
+
+
+class Profiles(unittest.TestCase):
+    communication_network = CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v1', 'v3'], 'h3': ['v2', 'v4'], 'h4': ['v3', 'v4'], 'h5': ['v4', 'v5']},
+                                                 {'h1': 1, 'h2': 3, 'h3': 4, 'h4': 5, 'h5': 6})
+
+    def test_pareto_profiles(self):
+        profiles = single_source_profile(Profiles.communication_network, 'v1')
+        self.assertEqual(profiles, {'v2': [(1, 1)], 'v3': [(3, 3)], 'v4': [(1, 4), (3, 5)], 'v5': [(3, 6)]})
+        self.assertEqual(foremost_at(profiles, 2), {'v3': 3, 'v4': 5, 'v5': 6})
+        self.assertEqual(fastest_at(profiles, 2), {'v3': 0, 'v4': 2, 'v5': 3})
+
+    def test_equivalent_to_dijkstra(self):
+        communication_network = CommunicationNetwork.from_json('./data/networks/SimpleTestData.json')
+        departures = [None] + sorted(communication_network.timings().values())
+        for participant in communication_network.participants():
+            profiles = single_source_profile(communication_network, participant)
+            for departure in departures:
+                self.assertEqual(foremost_at(profiles, departure), single_source_dijkstra_hyperedges(communication_network, participant, DistanceType.FOREMOST, window=(departure, None)))
+                self.assertEqual(fastest_at(profiles, departure), single_source_dijkstra_hyperedges(communication_network, participant, DistanceType.FASTEST, window=(departure, None)))
+
+
+class Instrumentation(unittest.TestCase):
+    communication_network = CommunicationNetwork.from_json('./data/networks/SimpleTestData.json')
+
+    def test_counters(self):
+        for distance_type in DistanceType:
+            for single_source_dijkstra in (single_source_dijkstra_hyperedges, single_source_dijkstra_vertices):
+                counters = SearchCounters()
+                distances = single_source_dijkstra(Instrumentation.communication_network, 1, distance_type, counters=counters)
+                self.assertEqual(distances, single_source_dijkstra(Instrumentation.communication_network, 1, distance_type))
+                self.assertEqual(counters.pushes, counters.pops)
+                self.assertEqual(counters.pops - counters.stale, counters.labels)
+                self.assertGreaterEqual(counters.relaxations, counters.labels - 1)
+                if distance_type is not DistanceType.FOREMOST:
+                    self.assertLessEqual(counters.peak_queue, counters.pushes)
+
+    def test_hyperedge_counters(self):
+        counters = SearchCounters()
+        single_source_dijkstra_hyperedges(Instrumentation.communication_network, 1, DistanceType.SHORTEST, counters=counters)
+        # all channels but b and k are reached from 1, and each scans its successors once
+        self.assertEqual(counters.labels, 9)
+        self.assertEqual(counters.relaxations, 6 + 5 + 4 + 3 + 1 + 2 + 1)
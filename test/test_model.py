@@ -1,11 +1,17 @@
 import unittest
 import bz2
+import shutil
+import tempfile
+from pathlib import Path
 from unittest import mock
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing as mp
 
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
 from simulation.model import CommunicationNetwork
-from simulation.model import EntityNotFound
+from simulation.model import EntityNotFound, StaleCache, TimingCodec
+from simulation.synthetic import generate_network
 
 class ModelTest(unittest.TestCase):
 
@@ -175,3 +181,189 @@ class ModelDataTest(unittest.TestCase):
         self.assertEqual(len(communciation_network.hyperedges()), 309740)
 
         self.assertEqual(len(communciation_network.participants()), len(communciation_network.vertices()))
+
+
+class ModelIncidenceTest(unittest.TestCase):
+    communication_network = CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v2', 'v3', 'v3'], 'h3': ['v3', 'v4']}, {'h1': 1, 'h2': 2, 'h3': 3})
+
+    def test_incidence_matches_accessors(self):
+        network = ModelIncidenceTest.communication_network
+        vertex_ids, hedge_ids = network.vertex_ids(), network.hyperedge_ids()
+        offsets, indices = network.hyperedge_incidence()
+        for hedge in network.hyperedges():
+            i = network.hyperedge_index(hedge)
+            self.assertEqual({vertex_ids[v] for v in indices[offsets[i]:offsets[i + 1]]}, network.vertices(hedge))
+        offsets, indices = network.vertex_incidence()
+        for vertex in network.vertices():
+            i = network.vertex_index(vertex)
+            self.assertEqual({hedge_ids[h] for h in indices[offsets[i]:offsets[i + 1]]}, network.hyperedges(vertex))
+
+    def test_successor_incidence(self):
+        network = CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v2', 'v3'], 'h3': ['v3', 'v4'], 'h4': ['v2', 'v4'], 'h5': ['v1']},
+                                       {'h1': 1, 'h2': 2, 'h3': 3, 'h4': 2, 'h5': 3})
+        hedge_ids = network.hyperedge_ids()
+        offsets, indices = network.successor_incidence()
+        successors = {hedge_ids[i]: [hedge_ids[h] for h in indices[offsets[i]:offsets[i + 1]]] for i in range(len(hedge_ids))}
+        self.assertEqual(successors, {'h1': ['h2', 'h4', 'h5'], 'h2': ['h3'], 'h3': [], 'h4': ['h3'], 'h5': []})
+
+    def test_window(self):
+        network = CommunicationNetwork({'h1': ['v1'], 'h2': ['v2'], 'h3': ['v3'], 'h4': ['v4']},
+                                       {'h1': datetime(2023, 1, 3), 'h2': datetime(2023, 1, 1), 'h3': datetime(2023, 1, 2), 'h4': datetime(2023, 1, 2)})
+        hedge_ids = network.hyperedge_ids()
+        self.assertEqual([hedge_ids[h] for h in network.window()], ['h2', 'h3', 'h4', 'h1'])
+        self.assertEqual([hedge_ids[h] for h in network.window(datetime(2023, 1, 1, 0, 0, 0, 1), datetime(2023, 1, 2, 23))], ['h3', 'h4'])
+        self.assertEqual([hedge_ids[h] for h in network.window(end=datetime(2023, 1, 2))], ['h2', 'h3', 'h4'])
+        self.assertIs(network.window().base, network.timing_index().order)
+
+    def test_timing_array(self):
+        network = ModelIncidenceTest.communication_network
+        self.assertEqual(network.timing_array().dtype, 'int64')
+        self.assertEqual(network.timing_array().tolist(), [1, 2, 3])
+
+    def test_datetime_timings_round_trip(self):
+        timings = {'h1': datetime(2023, 5, 26, 12, 1, 1), 'h2': datetime(1, 1, 1, 0, 0, 0, 1)}
+        communication_network = CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v2']}, timings)
+        self.assertEqual(communication_network.timings(), timings)
+
+    def test_views(self):
+        network = ModelIncidenceTest.communication_network
+        self.assertIn('v3', network.vertices('h2'))
+        self.assertNotIn('v1', network.vertices('h2'))
+        self.assertNotIn('v5', network.vertices('h2'))
+        self.assertIn('h2', network.hyperedges('v3'))
+        self.assertEqual(len(network.vertices('h2')), 2)
+        self.assertEqual(network.vertices('h2'), network.vertices('h2'))
+        self.assertNotEqual(network.vertices('h2'), network.vertices('h1'))
+
+    def test_view_set_operations(self):
+        view = ModelIncidenceTest.communication_network.vertices('h2')
+        self.assertEqual(view | {'v1'}, {'v1', 'v2', 'v3'})
+        self.assertEqual({'v1'} | view, {'v1', 'v2', 'v3'})
+        self.assertEqual(view & {'v2', 'v4'}, {'v2'})
+        self.assertEqual(view - {'v2'}, {'v3'})
+        self.assertEqual({'v2', 'v4'} - view, {'v4'})
+        self.assertEqual(view ^ {'v3', 'v4'}, {'v2', 'v4'})
+        self.assertIs(type(view | {'v1'}), set)
+        self.assertEqual(view.union(['v1'], {'v4'}), {'v1', 'v2', 'v3', 'v4'})
+        self.assertEqual(view.intersection({'v3'}), {'v3'})
+        self.assertEqual(view.difference(['v3']), {'v2'})
+        self.assertEqual(view.symmetric_difference(['v3', 'v4']), {'v2', 'v4'})
+        self.assertTrue(view.issubset(['v1', 'v2', 'v3']))
+        self.assertTrue(view.issuperset(['v2']))
+        self.assertEqual(view.copy(), {'v2', 'v3'})
+
+    def test_unknown_index(self):
+        with self.assertRaises(EntityNotFound):
+            ModelIncidenceTest.communication_network.vertex_index('v5')
+        with self.assertRaises(EntityNotFound):
+            ModelIncidenceTest.communication_network.hyperedge_index('h5')
+
+
+def build_cache(paths):
+    json_path, cache_path = paths
+    return sorted(CommunicationNetwork.from_json_cached(json_path, cache_path).timings().items())
+
+
+class ModelBinaryCache(unittest.TestCase):
+
+    def assert_identical(self, loaded, expected):
+        self.assertEqual(loaded.vertex_ids(), expected.vertex_ids())
+        self.assertEqual(loaded.hyperedge_ids(), expected.hyperedge_ids())
+        self.assertEqual(loaded.timings(), expected.timings())
+        for key, array in expected.arrays().items():
+            self.assertEqual(loaded.arrays()[key].tolist(), array.tolist())
+        for participant in expected.participants():
+            self.assertEqual(loaded.channels(participant), expected.channels(participant))
+
+    def test_save_and_load(self):
+        communication_network = CommunicationNetwork.from_json('./data/networks/SimpleTestData.json')
+        with tempfile.TemporaryDirectory() as directory:
+            communication_network.save(Path(directory)/'simple.network')
+            loaded = CommunicationNetwork.load(Path(directory)/'simple.network', name='simple')
+            self.assertEqual(loaded.name, 'simple')
+            self.assert_identical(loaded, communication_network)
+
+    def test_from_json_cached(self):
+        with tempfile.TemporaryDirectory() as directory:
+            json_path = Path(directory)/'simple.json'
+            cache_path = Path(directory)/'simple.network'
+            shutil.copy('./data/networks/SimpleTestData.json', json_path)
+            expected = CommunicationNetwork.from_json(json_path)
+            self.assert_identical(CommunicationNetwork.from_json_cached(json_path, cache_path), expected)
+            self.assertTrue(cache_path.exists())
+            self.assert_identical(CommunicationNetwork.load(cache_path, source=json_path), expected)
+
+            json_path.write_text('{"Review_1":{"end":"2023-05-26T12:01:01", "participants": ["Anton","Simon"]}}')
+            with self.assertRaises(StaleCache):
+                CommunicationNetwork.load(cache_path, source=json_path)
+            self.assertEqual(CommunicationNetwork.from_json_cached(json_path, cache_path).participants('Review_1'), {'Anton', 'Simon'})
+
+    def test_concurrent_builds(self):
+        with tempfile.TemporaryDirectory() as directory, ProcessPoolExecutor(8, mp_context=mp.get_context('spawn')) as executor:
+            json_path, cache_path = Path(directory)/'synthetic.json', Path(directory)/'synthetic.network'
+            for seed in (0, 1):  # a fresh cache, then a stale one
+                generate_network(json_path, 2000, seed=seed)
+                expected = sorted(CommunicationNetwork.from_json(json_path).timings().items())
+                for timings in executor.map(build_cache, [(json_path, cache_path)] * 16):
+                    self.assertEqual(timings, expected)
+                self.assertEqual(sorted(CommunicationNetwork.load(cache_path, source=json_path).timings().items()), expected)
+                self.assertEqual(sorted(path.name for path in Path(directory).iterdir()), ['synthetic.json', 'synthetic.network'])
+
+    def test_incomplete_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache_path = Path(directory)/'simple.network'
+            CommunicationNetwork.from_json('./data/networks/SimpleTestData.json').save(cache_path)
+            (cache_path/'successors.npy').unlink()
+            with self.assertRaises(StaleCache):
+                CommunicationNetwork.load(cache_path)
+
+
+class ModelIntegerTimings(unittest.TestCase):
+
+    def test_seconds_resolution(self):
+        timings = {'h1': datetime(2023, 5, 26, 12, 1, 1), 'h2': datetime(2023, 5, 26, 12, 1, 2)}
+        communication_network = CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v2']}, timings)
+        self.assertEqual(communication_network.timing_codec().resolution, timedelta(seconds=1))
+        self.assertEqual(communication_network.timing_array()[1] - communication_network.timing_array()[0], 1)
+        self.assertEqual(communication_network.timings(), timings)
+
+    def test_microseconds_fallback(self):
+        timings = {'h1': datetime(2023, 5, 26, 12, 1, 1), 'h2': datetime(2023, 5, 26, 12, 1, 1, 5)}
+        communication_network = CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v2']}, timings)
+        self.assertEqual(communication_network.timing_codec().resolution, timedelta(microseconds=1))
+        self.assertEqual(communication_network.timings(), timings)
+
+    def test_configured_resolution(self):
+        timings = {'h1': datetime(2023, 5, 26, 12, 0), 'h2': datetime(2023, 5, 26, 12, 5)}
+        communication_network = CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v2']}, timings, resolution=timedelta(minutes=1))
+        self.assertEqual(communication_network.timing_array()[1] - communication_network.timing_array()[0], 5)
+        self.assertEqual(communication_network.timings(), timings)
+        with self.assertRaises(ValueError):
+            CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v2']}, timings, resolution=timedelta(hours=1))
+
+    def test_timezone_aware_timings(self):
+        with tempfile.TemporaryDirectory() as directory:
+            json_path = Path(directory)/'aware.json'
+            json_path.write_text('{"h1": {"end": "2023-05-26T12:01:01Z", "participants": ["v1", "v2"]}, "h2": {"end": "2023-05-26T14:01:02+02:00", "participants": ["v2"]}}')
+            communication_network = CommunicationNetwork.from_json(json_path)
+            self.assertEqual(communication_network.timings(), {'h1': datetime(2023, 5, 26, 12, 1, 1, tzinfo=timezone.utc), 'h2': datetime(2023, 5, 26, 12, 1, 2, tzinfo=timezone.utc)})
+            self.assertEqual(communication_network.timings('h2').utcoffset(), timedelta(0))
+            self.assertEqual(communication_network.timing_array().tolist(), [1685102461, 1685102462])
+            communication_network.save(Path(directory)/'aware.network')
+            self.assertEqual(CommunicationNetwork.load(Path(directory)/'aware.network').timings(), communication_network.timings())
+        codec = TimingCodec.from_json(TimingCodec.for_timings([datetime(2023, 1, 1, tzinfo=timezone(timedelta(hours=-5)))]).to_json())
+        self.assertEqual(codec.decode(0).utcoffset(), timedelta(hours=-5))
+        with self.assertRaises(ValueError):
+            CommunicationNetwork({'h1': ['v1'], 'h2': ['v2']}, {'h1': datetime(2023, 1, 1, tzinfo=timezone.utc), 'h2': datetime(2023, 1, 2)})
+
+    def test_float_timings(self):
+        communication_network = CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v2']}, {'h1': 1.0, 'h2': 2})
+        self.assertEqual(communication_network.timing_array().tolist(), [1, 2])
+        # other numbers are multiples of the coarsest common resolution and decode to the floats they were
+        communication_network = CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v2'], 'h3': ['v2', 'v3']}, {'h1': 1.5, 'h2': 2, 'h3': 0.1})
+        self.assertEqual(communication_network.timing_array().tolist(), [15, 20, 1])
+        self.assertEqual(communication_network.timings(), {'h1': 1.5, 'h2': 2.0, 'h3': 0.1})
+        self.assertEqual(TimingCodec.from_json(communication_network.timing_codec().to_json()).decode(15), 1.5)
+        for timing in (float('nan'), float('inf'), '1'):
+            with self.assertRaises(ValueError):
+                CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v2']}, {'h1': timing, 'h2': 2})
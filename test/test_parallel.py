@@ -0,0 +1,92 @@
+import unittest
+import tempfile
+import multiprocessing as mp
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from simulation.model import CommunicationNetwork
+from simulation.minimal_paths import single_source_dijkstra_hyperedges, DistanceType
+from simulation.parallel import SharedHypergraph, attach, schedule, estimate_costs, cost_ordered_chunks, single_source_task, foremost_task
+from simulation.metrics import Metrics, read_metrics
+
+
+class SharedNetwork(unittest.TestCase):
+    communication_network = CommunicationNetwork.from_json('./data/networks/SimpleTestData.json', name='simple')
+
+    def test_attach(self):
+        with SharedHypergraph(SharedNetwork.communication_network) as shared_network:
+            attached, segments = attach(shared_network.handle)
+            self.assertEqual(attached.name, 'simple')
+            self.assertEqual(attached.timings(), SharedNetwork.communication_network.timings())
+            self.assertEqual(set(attached.participants()), set(SharedNetwork.communication_network.participants()))
+            for participant in attached.participants():
+                self.assertEqual(attached.channels(participant), SharedNetwork.communication_network.channels(participant))
+            with self.assertRaises(ValueError):
+                attached.timing_array()[0] = 0
+            del attached
+            for segment in segments:
+                segment.close()
+
+    def test_persistent_workers(self):
+        participants = tuple(sorted(SharedNetwork.communication_network.participants()))
+        other_network = CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v2', 'v3']}, {'h1': 1, 'h2': 2})
+        with ProcessPoolExecutor(mp_context=mp.get_context('spawn'), max_workers=2) as executor:
+            for communication_network, sources in ((SharedNetwork.communication_network, participants), (other_network, ('v1', 'v2', 'v3'))):
+                with SharedHypergraph(communication_network) as shared_network:
+                    for distance_type in (DistanceType.SHORTEST, DistanceType.FOREMOST):
+                        futures = schedule(executor, shared_network, communication_network, sources, distance_type, single_source_dijkstra_hyperedges, 2)
+                        result = {}
+                        for future, chunk in futures.items():
+                            self.assertEqual(set(future.result()), set(chunk))
+                            result.update(future.result())
+                        self.assertEqual(set(result), set(sources))
+                        for source in sources:
+                            self.assertEqual(result[source], single_source_dijkstra_hyperedges(communication_network, source, distance_type))
+
+
+class Instrumentation(unittest.TestCase):
+    communication_network = CommunicationNetwork.from_json('./data/networks/SimpleTestData.json')
+
+    def test_metrics(self):
+        participants = tuple(sorted(Instrumentation.communication_network.participants()))
+        with tempfile.TemporaryDirectory() as directory, SharedHypergraph(Instrumentation.communication_network) as shared_network:
+            with Metrics(Path(directory)/'metrics.jsonl') as metrics:
+                for distance_type in DistanceType:
+                    with metrics.phase('merge', distance_type):
+                        if distance_type is DistanceType.FOREMOST:
+                            results, records, seconds = foremost_task(shared_network.handle, participants, instrument=True)
+                        else:
+                            results, records, seconds = single_source_task(shared_network.handle, single_source_dijkstra_hyperedges, participants, distance_type, instrument=True)
+                    self.assertEqual(results, single_source_task(shared_network.handle, single_source_dijkstra_hyperedges, participants, distance_type))
+                    metrics.sources('simple', distance_type, 'hyperedges', records)
+                    metrics.add('compute', seconds, distance_type)
+                metrics.close_network('simple')
+            sources, phases = read_metrics(Path(directory)/'metrics.jsonl')
+        self.assertEqual(len(sources), 3 * len(participants))
+        self.assertEqual(sources[sources.distance_type == 'foremost'].labels.tolist(), [len(results[source]) for source in participants])
+        self.assertTrue((sources[sources.distance_type == 'fastest'].stale >= 0).all())
+        self.assertEqual(sorted(phases.phase.unique()), ['compute', 'merge'])
+
+    def test_disabled(self):
+        with Metrics() as metrics:
+            with metrics.phase('write'):
+                metrics.sources('simple', DistanceType.SHORTEST, 'hyperedges', [{'source': 1}])
+            metrics.close_network('simple')
+            self.assertFalse(metrics.enabled)
+
+
+class Scheduling(unittest.TestCase):
+
+    def test_costs(self):
+        communication_network = CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v2', 'v3'], 'h3': ['v3', 'v4']}, {'h1': 1, 'h2': 2, 'h3': 3})
+        self.assertEqual(estimate_costs(communication_network, ['v1', 'v2', 'v4']).tolist(), [4, 5, 2])
+
+    def test_chunks(self):
+        sources = tuple(f'v{i}' for i in range(100))
+        costs = np.array([1000] * 4 + [1] * 96)
+        chunks = cost_ordered_chunks(sources, costs, num_workers=2)
+        self.assertEqual(sorted(source for chunk in chunks for source in chunk), sorted(sources))
+        self.assertEqual(chunks[:4], [('v0', ), ('v1', ), ('v2', ), ('v3', )])
+        self.assertTrue(all(len(chunk) <= 256 for chunk in chunks))
@@ -0,0 +1,194 @@
+import unittest
+import tempfile
+from datetime import timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from simulation.model import CommunicationNetwork
+from simulation.minimal_paths import single_source_dijkstra_hyperedges, single_source_dijkstra_vertices, all_sources_foremost, DistanceType
+from simulation.results import ResultWriter, ResultMatrices, read_result, shard_directory, write_manifest, read_shards, merge_shards, float_bits, _decode
+
+
+def in_memory_result(communication_network, participants):
+    # the way run_simulation assembled results before they were streamed to disk
+    category = pd.api.types.CategoricalDtype(categories=participants, ordered=False)
+    data_frames = []
+    for distance_type in DistanceType:
+        min_distances = [(source, target, distance) for source in participants
+                         for target, distance in single_source_dijkstra_hyperedges(communication_network, source, distance_type).items()]
+        min_distances_df = pd.DataFrame(min_distances, columns=['source', 'target', 'distance'])
+        min_distances_df.source = min_distances_df.source.astype(category)
+        min_distances_df.target = min_distances_df.target.astype(category)
+        data_frames += [min_distances_df.set_index(['source', 'target']).distance.rename(distance_type.name.lower()).sort_index()]
+    return pd.concat(data_frames, axis=1).sort_index()
+
+
+class StreamingResults(unittest.TestCase):
+    communication_network = CommunicationNetwork.from_json('./data/networks/SimpleTestData.json')
+
+    def test_identical_to_in_memory_result(self):
+        participants = tuple(sorted(StreamingResults.communication_network.participants()))
+        with tempfile.TemporaryDirectory() as directory:
+            writer = ResultWriter(Path(directory)/'parts', participants, shard_rows=10)
+            for distance_type in DistanceType:
+                for source in reversed(participants):
+                    writer.write(distance_type, {source: single_source_dijkstra_hyperedges(StreamingResults.communication_network, source, distance_type)})
+            writer.close()
+            self.assertGreater(len(list((Path(directory)/'parts'/'shortest').glob('*.npy'))), 1)
+            result = read_result(Path(directory)/'parts', participants)
+        expected = in_memory_result(StreamingResults.communication_network, participants)
+        pd.testing.assert_frame_equal(result, expected)
+        self.assertEqual(result.to_csv(), expected.to_csv())
+
+
+class TimezoneAwareResults(unittest.TestCase):
+
+    def test_identical_to_in_memory_result(self):
+        simple = CommunicationNetwork.from_json('./data/networks/SimpleTestData.json')
+        communication_network = CommunicationNetwork({channel: list(simple.participants(channel)) for channel in simple.channels()},
+                                                     {channel: timing.replace(tzinfo=timezone.utc) for channel, timing in simple.timings().items()})
+        participants = tuple(sorted(communication_network.participants()))
+        expected = in_memory_result(communication_network, participants)
+        self.assertIsInstance(expected.foremost.dtype, pd.DatetimeTZDtype)
+        with tempfile.TemporaryDirectory() as directory:
+            writer = ResultWriter(Path(directory)/'parts', participants)
+            matrices = ResultMatrices.create(Path(directory)/'matrix', communication_network, participants)
+            for distance_type in DistanceType:
+                writer.write(distance_type, {source: single_source_dijkstra_hyperedges(communication_network, source, distance_type) for source in participants})
+                matrices.write_rows(distance_type, {source: single_source_dijkstra_hyperedges(communication_network, source, distance_type, encoded=True) for source in participants})
+                matrices.complete(distance_type, participants)
+            writer.close()
+            pd.testing.assert_frame_equal(read_result(Path(directory)/'parts', participants), expected)
+            pd.testing.assert_frame_equal(matrices.frame(), expected)
+
+
+class FloatResults(unittest.TestCase):
+
+    def test_identical_to_in_memory_result(self):
+        communication_network = CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v2', 'v3'], 'h3': ['v3', 'v4'], 'h4': ['v5', 'v1']}, {'h1': -1.5, 'h2': 2.25, 'h3': 3, 'h4': -2.1})
+        participants = tuple(sorted(communication_network.participants()))
+        expected = in_memory_result(communication_network, participants)
+        self.assertEqual(expected.foremost.dtype, np.float64)
+        with tempfile.TemporaryDirectory() as directory:
+            writer = ResultWriter(Path(directory)/'parts', participants)
+            matrices = ResultMatrices.create(Path(directory)/'matrix', communication_network, participants)
+            for distance_type in DistanceType:
+                writer.write(distance_type, {source: single_source_dijkstra_hyperedges(communication_network, source, distance_type) for source in participants})
+                matrices.write_rows(distance_type, {source: single_source_dijkstra_hyperedges(communication_network, source, distance_type, encoded=True) for source in participants})
+                matrices.complete(distance_type, participants)
+            writer.close()
+            pd.testing.assert_frame_equal(read_result(Path(directory)/'parts', participants), expected)
+            pd.testing.assert_frame_equal(matrices.frame(), expected)
+
+    def test_float_bits_sort_like_floats(self):
+        values = np.array([-np.inf, -2.5, -0.1, -0.0, 0.0, 1e-300, 0.1, 2.5, np.inf])
+        bits = float_bits(values)
+        self.assertTrue((np.diff(bits) > 0).all())
+        np.testing.assert_array_equal(_decode(bits, 'float'), values)
+
+
+class Checkpointing(unittest.TestCase):
+    communication_network = CommunicationNetwork.from_json('./data/networks/SimpleTestData.json')
+
+    def test_resume(self):
+        participants = tuple(sorted(Checkpointing.communication_network.participants()))
+        with tempfile.TemporaryDirectory() as directory:
+            writer = ResultWriter(Path(directory)/'parts', participants, shard_rows=10)
+            for source in participants[:6]:
+                writer.write(DistanceType.SHORTEST, {source: single_source_dijkstra_hyperedges(Checkpointing.communication_network, source, DistanceType.SHORTEST)})
+            # interrupted: buffered but unflushed results and half-written shards are lost
+            (Path(directory)/'parts'/'shortest'/'000099.tmp').write_bytes(b'')
+            del writer
+
+            writer = ResultWriter(Path(directory)/'parts', participants, shard_rows=10, resume=True)
+            completed = writer.completed(DistanceType.SHORTEST)
+            self.assertTrue(completed)
+            self.assertTrue(completed < set(participants))
+            self.assertEqual(writer.completed(DistanceType.FASTEST), set())
+            self.assertFalse((Path(directory)/'parts'/'shortest'/'000099.tmp').exists())
+            for distance_type in DistanceType:
+                for source in participants:
+                    if source not in writer.completed(distance_type):
+                        writer.write(distance_type, {source: single_source_dijkstra_hyperedges(Checkpointing.communication_network, source, distance_type)})
+                writer.close()
+            result = read_result(Path(directory)/'parts', participants)
+        pd.testing.assert_frame_equal(result, in_memory_result(Checkpointing.communication_network, participants))
+
+    def test_fresh_run_discards_checkpoints(self):
+        participants = tuple(sorted(Checkpointing.communication_network.participants()))
+        with tempfile.TemporaryDirectory() as directory:
+            writer = ResultWriter(Path(directory)/'parts', participants)
+            writer.write(DistanceType.SHORTEST, {participants[0]: {}})
+            writer.close()
+            self.assertEqual(ResultWriter(Path(directory)/'parts', participants, resume=True).completed(DistanceType.SHORTEST), {participants[0]})
+            self.assertEqual(ResultWriter(Path(directory)/'parts', participants).completed(DistanceType.SHORTEST), set())
+
+
+class DenseResults(unittest.TestCase):
+    communication_network = CommunicationNetwork.from_json('./data/networks/SimpleTestData.json')
+
+    def test_identical_to_in_memory_result(self):
+        participants = tuple(sorted(DenseResults.communication_network.participants()))
+        with tempfile.TemporaryDirectory() as directory:
+            matrices = ResultMatrices.create(Path(directory)/'matrix', DenseResults.communication_network, participants)
+            for distance_type in DistanceType:
+                for single_source_dijkstra in (single_source_dijkstra_hyperedges, single_source_dijkstra_vertices):
+                    results = {source: single_source_dijkstra(DenseResults.communication_network, source, distance_type, encoded=True) for source in participants}
+                    ResultMatrices(Path(directory)/'matrix').write_rows(distance_type, results)
+                matrices.complete(distance_type, participants)
+            self.assertEqual(matrices.matrix(DistanceType.SHORTEST).dtype, np.int16)
+            pd.testing.assert_frame_equal(matrices.frame(), in_memory_result(DenseResults.communication_network, participants))
+            self.assertEqual(matrices.row(1, DistanceType.FOREMOST).to_dict(), single_source_dijkstra_hyperedges(DenseResults.communication_network, 1, DistanceType.FOREMOST))
+            self.assertEqual(ResultMatrices(Path(directory)/'matrix').matrix(DistanceType.FASTEST)[0, 0], np.iinfo(np.int64).min)
+
+    def test_resume(self):
+        participants = tuple(sorted(DenseResults.communication_network.participants()))
+        with tempfile.TemporaryDirectory() as directory:
+            matrices = ResultMatrices.create(Path(directory)/'matrix', DenseResults.communication_network, participants)
+            matrices.write_rows(DistanceType.FOREMOST, all_sources_foremost(DenseResults.communication_network, participants[:3], encoded=True))
+            matrices.complete(DistanceType.FOREMOST, participants[:3])
+            # rows written by a task that never returned are not completed
+            matrices.write_rows(DistanceType.FOREMOST, all_sources_foremost(DenseResults.communication_network, participants[3:5], encoded=True))
+            matrices = ResultMatrices.create(Path(directory)/'matrix', DenseResults.communication_network, participants, resume=True)
+            self.assertEqual(matrices.completed(DistanceType.FOREMOST), set(participants[:3]))
+            foremost = matrices.frame().foremost.dropna()
+            self.assertEqual(set(foremost.index.get_level_values('source')), set(participants[:3]))
+            self.assertEqual(ResultMatrices.create(Path(directory)/'matrix', DenseResults.communication_network, participants).completed(DistanceType.FOREMOST), set())
+
+
+class Shards(unittest.TestCase):
+    communication_network = CommunicationNetwork.from_json('./data/networks/SimpleTestData.json')
+    participants = tuple(sorted(communication_network.participants()))
+
+    def write_shard(self, directory, index, count, sources=None):
+        path = shard_directory(directory, 'simple', index, count)
+        writer = ResultWriter(path, Shards.participants)
+        for distance_type in DistanceType:
+            for source in Shards.participants[index::count] if sources is None else sources:
+                writer.write(distance_type, {source: single_source_dijkstra_hyperedges(Shards.communication_network, source, distance_type)})
+            writer.close()
+        write_manifest(path, 'simple', index, count, Shards.participants, './data/networks/SimpleTestData.json', writer)
+
+    def test_merge(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for index in (2, 0, 1):
+                self.write_shard(directory, index, 3)
+            paths = read_shards(directory, 'simple', Shards.participants, './data/networks/SimpleTestData.json')
+            result = merge_shards(paths, Shards.participants)
+        expected = in_memory_result(Shards.communication_network, Shards.participants)
+        pd.testing.assert_frame_equal(result, expected)
+        self.assertEqual(result.to_csv(), expected.to_csv())
+
+    def test_incomplete(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.write_shard(directory, 0, 2)
+            with self.assertRaises(ValueError):
+                read_shards(directory, 'simple', Shards.participants)
+            # a source computed by two shards
+            self.write_shard(directory, 1, 2, Shards.participants[:2])
+            with self.assertRaises(ValueError):
+                read_shards(directory, 'simple', Shards.participants)
+            with self.assertRaises(ValueError):
+                read_shards(directory, 'simple', Shards.participants, './data/networks/testDataNetworks.json')
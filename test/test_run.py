@@ -0,0 +1,36 @@
+import unittest
+import subprocess
+import sys
+import tempfile
+from unittest import mock
+from pathlib import Path
+
+from simulation.model import CommunicationNetwork, EntityNotFound
+from simulation.run import read_targets, load_network
+
+
+class Run(unittest.TestCase):
+
+    def test_no_pandas_at_import(self):
+        # neither the driver nor the workers need pandas before data frames are built
+        modules = subprocess.run([sys.executable, '-c', 'import sys, simulation.run, simulation.parallel; print("pandas" in sys.modules, "tqdm" in sys.modules)'],
+                                 capture_output=True, text=True, check=True).stdout.split()
+        self.assertEqual(modules, ['False', 'False'])
+
+    def test_read_targets(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory)/'targets.txt'
+            path.write_text('1\n\n 7 \n')
+            self.assertEqual(read_targets(path, tuple(range(1, 12))), {1, 7})
+            path.write_text('1\n12\n')
+            with self.assertRaises(EntityNotFound):
+                read_targets(path, tuple(range(1, 12)))
+
+    def test_load_network(self):
+        communication_network = CommunicationNetwork.from_json('./data/networks/SimpleTestData.json')
+        with mock.patch('simulation.run.CommunicationNetwork.from_json_cached', return_value=communication_network) as from_json_cached:
+            loaded, new_channels, _, classes, _ = load_network('simple', collapse=True)
+        from_json_cached.assert_called_once()
+        self.assertIs(loaded, communication_network)
+        self.assertIsNone(new_channels)
+        self.assertEqual(sorted(member for members in classes.values() for member in members), sorted(communication_network.participants()))
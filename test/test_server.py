@@ -0,0 +1,74 @@
+import unittest
+import asyncio
+import json
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from simulation.model import CommunicationNetwork
+from simulation.minimal_paths import single_source_dijkstra_hyperedges, DistanceType
+from simulation.server import QueryServer, query
+
+
+class Server(unittest.IsolatedAsyncioTestCase):
+    communication_network = CommunicationNetwork.from_json('./data/networks/SimpleTestData.json')
+
+    def setUp(self):
+        self.server = QueryServer({'simple': Server.communication_network}, cache_size=2)
+        self.listener, self.port = None, None
+
+    async def asyncSetUp(self):
+        self.listener = await self.server.start(port=0)
+        self.port = self.listener.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.listener.close()
+        await self.listener.wait_closed()
+        self.server.close()
+
+    async def test_queries(self):
+        reader, writer = await asyncio.open_connection('127.0.0.1', self.port)
+        requests = [{'query': 'distances', 'source': 1, 'distance_type': 'fastest'},
+                    {'network': 'simple', 'query': 'distance', 'source': 1, 'target': 5, 'distance_type': 'shortest'},
+                    {'query': 'reachable', 'source': 1, 'by': '2020-02-10T00:00:00'},
+                    {'query': 'distance', 'source': 1, 'target': 99},
+                    {'network': 'other', 'query': 'networks'}]
+        for request in requests:
+            writer.write(json.dumps(request).encode() + b'\n')
+        responses = [json.loads(await reader.readline()) for _ in requests]
+        writer.close()
+
+        fastest = single_source_dijkstra_hyperedges(Server.communication_network, 1, DistanceType.FASTEST)
+        self.assertEqual(dict(map(tuple, responses[0]['distances'])), {target: distance.total_seconds() for target, distance in fastest.items()})
+        self.assertEqual(responses[1]['distance'], single_source_dijkstra_hyperedges(Server.communication_network, 1, DistanceType.SHORTEST)[5])
+        foremost = single_source_dijkstra_hyperedges(Server.communication_network, 1, DistanceType.FOREMOST)
+        self.assertEqual(sorted(responses[2]['reachable']), sorted(target for target, arrival in foremost.items() if arrival <= datetime(2020, 2, 10)))
+        self.assertIn('EntityNotFound', responses[3]['error'])
+        self.assertEqual(responses[4], {'networks': ['simple']})
+        self.assertEqual(await asyncio.to_thread(query, {'query': 'stats'}, port=self.port), {'hits': 0, 'misses': 3, 'coalesced': 0, 'cached': 2, 'pending': 0})
+
+    async def test_cache_and_coalescing(self):
+        results = await asyncio.gather(*(self.server.distances('simple', 1, DistanceType.FASTEST) for _ in range(5)))
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(self.server.stats, {'hits': 0, 'misses': 1, 'coalesced': 4})
+        await self.server.distances('simple', 2, DistanceType.FASTEST)
+        await self.server.distances('simple', 1, DistanceType.FASTEST)
+        await self.server.distances('simple', 3, DistanceType.FASTEST)
+        # least recently used: source 2 was evicted, source 1 is still cached
+        await self.server.distances('simple', 1, DistanceType.FASTEST)
+        await self.server.distances('simple', 2, DistanceType.FASTEST)
+        self.assertEqual(self.server.stats, {'hits': 2, 'misses': 4, 'coalesced': 4})
+
+
+class ServerProcesses(unittest.IsolatedAsyncioTestCase):
+    communication_network = CommunicationNetwork.from_json('./data/networks/SimpleTestData.json')
+
+    async def test_process_pool(self):
+        with ProcessPoolExecutor(mp_context=mp.get_context('spawn'), max_workers=1) as executor:
+            server = QueryServer({'simple': ServerProcesses.communication_network}, executor)
+            try:
+                response = await server.answer({'query': 'distances', 'source': 2, 'distance_type': 'foremost'})
+            finally:
+                server.close()
+        foremost = single_source_dijkstra_hyperedges(ServerProcesses.communication_network, 2, DistanceType.FOREMOST)
+        self.assertEqual(dict(map(tuple, response['distances'])), {target: arrival.isoformat() for target, arrival in foremost.items()})
@@ -0,0 +1,55 @@
+import unittest
+from datetime import timedelta
+
+import numpy as np
+
+from simulation.model import CommunicationNetwork
+from simulation.minimal_paths import single_source_dijkstra_hyperedges, reachable_counts, DistanceType
+from simulation.summary import QuantileSketch, DistanceSummary, summary_edges
+
+
+class Sketch(unittest.TestCase):
+
+    def test_exact_below_capacity(self):
+        sketch = QuantileSketch(k=64)
+        sketch.update(np.arange(50)[::-1])
+        self.assertEqual(sketch.quantiles([0, 0.5, 1]), [0, 24, 49])
+
+    def test_merged_rank_error(self):
+        values = np.random.default_rng(1).permutation(100000)
+        sketches = [QuantileSketch(seed=i) for i in range(10)]
+        for sketch, part in zip(sketches, np.array_split(values, 10)):
+            sketch.update(part)
+        for sketch in sketches[1:]:
+            sketches[0].merge(sketch)
+        self.assertLess(sum(map(len, sketches[0].levels)), 2000)
+        for q, value in zip((0.1, 0.5, 0.9), sketches[0].quantiles((0.1, 0.5, 0.9))):
+            self.assertLess(abs(value / len(values) - q), 0.02)
+
+
+class Summaries(unittest.TestCase):
+    communication_network = CommunicationNetwork.from_json('./data/networks/SimpleTestData.json')
+    participants = tuple(sorted(communication_network.participants()))
+
+    def test_merge_equals_single_summary(self):
+        for distance_type in DistanceType:
+            edges = summary_edges(Summaries.communication_network, distance_type, bins=8)
+            results = {source: single_source_dijkstra_hyperedges(Summaries.communication_network, source, distance_type) for source in Summaries.participants}
+            merged, single = DistanceSummary(edges), DistanceSummary(edges)
+            for source, distances in results.items():
+                single.add(source, distances)
+                part = DistanceSummary(edges)
+                part.add(source, distances)
+                merged.merge(part)
+            self.assertEqual(merged.counts.tolist(), single.counts.tolist())
+            self.assertEqual(merged.reachable, single.reachable)
+            self.assertEqual(merged.counts.sum(), sum(map(len, results.values())))
+            self.assertEqual(merged.quantiles((0.5,)).value[0], single.quantiles((0.5,)).value[0])
+        self.assertEqual(merged.reachable, reachable_counts(Summaries.communication_network, Summaries.participants))
+
+    def test_histogram(self):
+        summary = DistanceSummary(summary_edges(Summaries.communication_network, DistanceType.FASTEST, bins=4))
+        summary.add('Anton', {'Simon': timedelta(0), 'Donald': timedelta(days=1000)})
+        histogram = summary.histogram()
+        self.assertEqual(histogram['count'].tolist(), [0, 1, 0, 0, 0, 1])
+        self.assertEqual(histogram['lower'][1], timedelta(0))
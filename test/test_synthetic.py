@@ -0,0 +1,27 @@
+import unittest
+import tempfile
+from pathlib import Path
+
+from simulation.model import CommunicationNetwork
+from simulation.synthetic import generate_network
+from simulation.benchmark import benchmark
+
+
+class Synthetic(unittest.TestCase):
+
+    def test_generate_network(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = generate_network(Path(directory)/'synthetic.json.bz2', 500, num_participants=80, seed=1)
+            communication_network = CommunicationNetwork.from_json(path)
+            self.assertEqual(len(communication_network.channels()), 500)
+            self.assertLessEqual(len(communication_network.participants()), 80)
+            self.assertTrue(all(len(communication_network.participants(channel)) >= 1 for channel in communication_network.channels()))
+            self.assertEqual(path.read_bytes(), generate_network(Path(directory)/'again.json.bz2', 500, num_participants=80, seed=1).read_bytes())
+
+    def test_benchmark(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = generate_network(Path(directory)/'synthetic.json', 200, seed=1)
+            result = benchmark(path, 'synthetic', num_sources=5, seed=1)
+        self.assertEqual(list(result.phase.unique()), ['load_json', 'build_cache', 'load_cache', 'engine'])
+        self.assertEqual(result.mismatches.sum(), 0)
+        self.assertEqual(len(result[result.phase == 'engine']), 7)